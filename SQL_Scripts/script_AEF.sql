@@ -5,7 +5,8 @@
 -- La tabla para almacenar los datos de entrenamiento basados en AlphaEarth
 CREATE TABLE AlphaEarth (
     -- Clave primaria: Identificador único para cada punto de entrenamiento
-    id_coordenadaAEF SERIAL PRIMARY KEY,
+    -- (la clave de partición anio forma parte de la clave primaria)
+    id_coordenadaAEF SERIAL,
 
     -- 1. Coordenadas Geográficas (WGS84) para fácil georreferenciación
     latitud DOUBLE PRECISION NOT NULL, 
@@ -19,73 +20,95 @@ CREATE TABLE AlphaEarth (
     es_residuo BOOLEAN NOT NULL,
     
     -- Columna 2: Etiqueta categórica (Clasificación de 3/4 tipos)
-    tipo_residuo VARCHAR(15), 
+    tipo_residuo VARCHAR(50), 
 
     -- 3. Las 64 Dimensiones del Embedding de AlphaEarth (A00 a A63)
     -- Tipo DOUBLE PRECISION es el estándar para datos científicos y de ML (float64 en Python).
     
-    a00 DOUBLE PRECISION,
-    a01 DOUBLE PRECISION,
-    a02 DOUBLE PRECISION,
-    a03 DOUBLE PRECISION,
-    a04 DOUBLE PRECISION,
-    a05 DOUBLE PRECISION,
-    a06 DOUBLE PRECISION,
-    a07 DOUBLE PRECISION,
-    a08 DOUBLE PRECISION,
-    a09 DOUBLE PRECISION,
-    a10 DOUBLE PRECISION,
-    a11 DOUBLE PRECISION,
-    a12 DOUBLE PRECISION,
-    a13 DOUBLE PRECISION,
-    a14 DOUBLE PRECISION,
-    a15 DOUBLE PRECISION,
-    a16 DOUBLE PRECISION,
-    a17 DOUBLE PRECISION,
-    a18 DOUBLE PRECISION,
-    a19 DOUBLE PRECISION,
-    a20 DOUBLE PRECISION,
-    a21 DOUBLE PRECISION,
-    a22 DOUBLE PRECISION,
-    a23 DOUBLE PRECISION,
-    a24 DOUBLE PRECISION,
-    a25 DOUBLE PRECISION,
-    a26 DOUBLE PRECISION,
-    a27 DOUBLE PRECISION,
-    a28 DOUBLE PRECISION,
-    a29 DOUBLE PRECISION,
-    a30 DOUBLE PRECISION,
-    a31 DOUBLE PRECISION,
-    a32 DOUBLE PRECISION,
-    a33 DOUBLE PRECISION,
-    a34 DOUBLE PRECISION,
-    a35 DOUBLE PRECISION,
-    a36 DOUBLE PRECISION,
-    a37 DOUBLE PRECISION,
-    a38 DOUBLE PRECISION,
-    a39 DOUBLE PRECISION,
-    a40 DOUBLE PRECISION,
-    a41 DOUBLE PRECISION,
-    a42 DOUBLE PRECISION,
-    a43 DOUBLE PRECISION,
-    a44 DOUBLE PRECISION,
-    a45 DOUBLE PRECISION,
-    a46 DOUBLE PRECISION,
-    a47 DOUBLE PRECISION,
-    a48 DOUBLE PRECISION,
-    a49 DOUBLE PRECISION,
-    a50 DOUBLE PRECISION,
-    a51 DOUBLE PRECISION,
-    a52 DOUBLE PRECISION,
-    a53 DOUBLE PRECISION,
-    a54 DOUBLE PRECISION,
-    a55 DOUBLE PRECISION,
-    a56 DOUBLE PRECISION,
-    a57 DOUBLE PRECISION,
-    a58 DOUBLE PRECISION,
-    a59 DOUBLE PRECISION,
-    a60 DOUBLE PRECISION,
-    a61 DOUBLE PRECISION,
-    a62 DOUBLE PRECISION,
-    a63 DOUBLE PRECISION
-);
\ No newline at end of file
+    a00 DOUBLE PRECISION NOT NULL,
+    a01 DOUBLE PRECISION NOT NULL,
+    a02 DOUBLE PRECISION NOT NULL,
+    a03 DOUBLE PRECISION NOT NULL,
+    a04 DOUBLE PRECISION NOT NULL,
+    a05 DOUBLE PRECISION NOT NULL,
+    a06 DOUBLE PRECISION NOT NULL,
+    a07 DOUBLE PRECISION NOT NULL,
+    a08 DOUBLE PRECISION NOT NULL,
+    a09 DOUBLE PRECISION NOT NULL,
+    a10 DOUBLE PRECISION NOT NULL,
+    a11 DOUBLE PRECISION NOT NULL,
+    a12 DOUBLE PRECISION NOT NULL,
+    a13 DOUBLE PRECISION NOT NULL,
+    a14 DOUBLE PRECISION NOT NULL,
+    a15 DOUBLE PRECISION NOT NULL,
+    a16 DOUBLE PRECISION NOT NULL,
+    a17 DOUBLE PRECISION NOT NULL,
+    a18 DOUBLE PRECISION NOT NULL,
+    a19 DOUBLE PRECISION NOT NULL,
+    a20 DOUBLE PRECISION NOT NULL,
+    a21 DOUBLE PRECISION NOT NULL,
+    a22 DOUBLE PRECISION NOT NULL,
+    a23 DOUBLE PRECISION NOT NULL,
+    a24 DOUBLE PRECISION NOT NULL,
+    a25 DOUBLE PRECISION NOT NULL,
+    a26 DOUBLE PRECISION NOT NULL,
+    a27 DOUBLE PRECISION NOT NULL,
+    a28 DOUBLE PRECISION NOT NULL,
+    a29 DOUBLE PRECISION NOT NULL,
+    a30 DOUBLE PRECISION NOT NULL,
+    a31 DOUBLE PRECISION NOT NULL,
+    a32 DOUBLE PRECISION NOT NULL,
+    a33 DOUBLE PRECISION NOT NULL,
+    a34 DOUBLE PRECISION NOT NULL,
+    a35 DOUBLE PRECISION NOT NULL,
+    a36 DOUBLE PRECISION NOT NULL,
+    a37 DOUBLE PRECISION NOT NULL,
+    a38 DOUBLE PRECISION NOT NULL,
+    a39 DOUBLE PRECISION NOT NULL,
+    a40 DOUBLE PRECISION NOT NULL,
+    a41 DOUBLE PRECISION NOT NULL,
+    a42 DOUBLE PRECISION NOT NULL,
+    a43 DOUBLE PRECISION NOT NULL,
+    a44 DOUBLE PRECISION NOT NULL,
+    a45 DOUBLE PRECISION NOT NULL,
+    a46 DOUBLE PRECISION NOT NULL,
+    a47 DOUBLE PRECISION NOT NULL,
+    a48 DOUBLE PRECISION NOT NULL,
+    a49 DOUBLE PRECISION NOT NULL,
+    a50 DOUBLE PRECISION NOT NULL,
+    a51 DOUBLE PRECISION NOT NULL,
+    a52 DOUBLE PRECISION NOT NULL,
+    a53 DOUBLE PRECISION NOT NULL,
+    a54 DOUBLE PRECISION NOT NULL,
+    a55 DOUBLE PRECISION NOT NULL,
+    a56 DOUBLE PRECISION NOT NULL,
+    a57 DOUBLE PRECISION NOT NULL,
+    a58 DOUBLE PRECISION NOT NULL,
+    a59 DOUBLE PRECISION NOT NULL,
+    a60 DOUBLE PRECISION NOT NULL,
+    a61 DOUBLE PRECISION NOT NULL,
+    a62 DOUBLE PRECISION NOT NULL,
+    a63 DOUBLE PRECISION NOT NULL,
+    -- Transacción que insertó la fila; la usa la detección incremental de cambios (PostgreSQL 13+)
+    xid_insercion BIGINT NOT NULL DEFAULT pg_current_xact_id()::text::bigint,
+
+    PRIMARY KEY (id_coordenadaAEF, anio)
+) PARTITION BY RANGE (anio);
+
+-- Una partición por año. La aplicación crea automáticamente las que falten
+-- (Web/src/partitions.py); para archivar un año: flask particiones-archivar --anio 2017
+-- (separa la partición y la renombra a alphaearth_2017_archivada para que el año se pueda volver a crear)
+-- (desde 2017 hasta el año siguiente al actual, como init_particiones al arrancar)
+DO $$
+BEGIN
+    FOR anio IN 2017 .. EXTRACT(YEAR FROM CURRENT_DATE)::int + 1 LOOP
+        EXECUTE format('CREATE TABLE IF NOT EXISTS alphaearth_%s PARTITION OF AlphaEarth FOR VALUES FROM (%s) TO (%s)', anio, anio, anio + 1);
+    END LOOP;
+END $$;
+
+-- Índice para las consultas por bounding box del mapa (/api/points/bbox)
+CREATE INDEX IF NOT EXISTS idx_alphaearth_lat_lon ON AlphaEarth (latitud, longitud);
+
+-- Índice para la detección incremental de cambios
+-- (en una base de datos ya creada, la columna y el índice se añaden con script_xid_insercion.sql)
+CREATE INDEX IF NOT EXISTS idx_alphaearth_xid_insercion ON AlphaEarth (xid_insercion);
\ No newline at end of file
@@ -1,6 +1,6 @@
 CREATE TABLE Sentinel2 (
     -- Clave primaria: Identificador único para cada punto de entrenamiento
-    id_sentinel2 SERIAL PRIMARY KEY, -- Identificador único
+    id_sentinel2 SERIAL, -- Identificador único (con fecha, clave de partición, forma la clave primaria)
 
     -- 1. Coordenadas Geográficas (WGS84)
     latitud DOUBLE PRECISION NOT NULL,  
@@ -9,24 +9,40 @@ CREATE TABLE Sentinel2 (
     
     -- 2. Etiquetas de Verdad Terreno (Ground Truth) para la Clasificación
     es_residuo BOOLEAN NOT NULL,
-    tipo_residuo VARCHAR(15),   
+    tipo_residuo VARCHAR(50),   
 
     -- 3. Las 12 Bandas Espectrales de Sentinel-2
     -- (Tipo DOUBLE PRECISION para almacenar la reflectancia)
     
-    b1 DOUBLE PRECISION, -- Banda 1 - Aerosoles
-    b2 DOUBLE PRECISION, -- Banda 2 - Azul
-    b3 DOUBLE PRECISION, -- Banda 3 - Verde
-    b4 DOUBLE PRECISION, -- Banda 4 - Rojo
-    b5 DOUBLE PRECISION, -- Banda 5 - Red Edge 1
-    b6 DOUBLE PRECISION, -- Banda 6 - Red Edge 2
-    b7 DOUBLE PRECISION, -- Banda 7 - Red Edge 3
-    b8 DOUBLE PRECISION, -- Banda 8 - NIR
-    b8a DOUBLE PRECISION, -- Banda 8A - Narrow NIR
-    b9 DOUBLE PRECISION, -- Banda 9 - Vapor de agua
-    b11 DOUBLE PRECISION, -- Banda 11 - SWIR 1
-    b12 DOUBLE PRECISION,  -- Banda 12 - SWIR 2
+    b1 DOUBLE PRECISION NOT NULL, -- Banda 1 - Aerosoles
+    b2 DOUBLE PRECISION NOT NULL, -- Banda 2 - Azul
+    b3 DOUBLE PRECISION NOT NULL, -- Banda 3 - Verde
+    b4 DOUBLE PRECISION NOT NULL, -- Banda 4 - Rojo
+    b5 DOUBLE PRECISION NOT NULL, -- Banda 5 - Red Edge 1
+    b6 DOUBLE PRECISION NOT NULL, -- Banda 6 - Red Edge 2
+    b7 DOUBLE PRECISION NOT NULL, -- Banda 7 - Red Edge 3
+    b8 DOUBLE PRECISION NOT NULL, -- Banda 8 - NIR
+    b8a DOUBLE PRECISION NOT NULL, -- Banda 8A - Narrow NIR
+    b9 DOUBLE PRECISION NOT NULL, -- Banda 9 - Vapor de agua
+    b11 DOUBLE PRECISION NOT NULL, -- Banda 11 - SWIR 1
+    b12 DOUBLE PRECISION NOT NULL,  -- Banda 12 - SWIR 2
     
-    -- CAMPO NUEVO PARA NUBOSIDAD
-    porcentaje_nubes DOUBLE PRECISION
-);
\ No newline at end of file
+    -- CAMPO NUEVO PARA NUBOSIDAD (porcentaje de nubes de la imagen)
+    nubosidad DOUBLE PRECISION,
+
+    PRIMARY KEY (id_sentinel2, fecha)
+) PARTITION BY RANGE (fecha);
+
+-- Una partición por año. La aplicación crea automáticamente las que falten
+-- (Web/src/partitions.py); para archivar un año: flask particiones-archivar --anio 2017
+-- (separa la partición y la renombra a sentinel2_2017_archivada para que el año se pueda volver a crear)
+-- (desde 2017 hasta el año siguiente al actual, como init_particiones al arrancar)
+DO $$
+BEGIN
+    FOR anio IN 2017 .. EXTRACT(YEAR FROM CURRENT_DATE)::int + 1 LOOP
+        EXECUTE format('CREATE TABLE IF NOT EXISTS sentinel2_%s PARTITION OF Sentinel2 FOR VALUES FROM (%L) TO (%L)', anio, make_date(anio, 1, 1), make_date(anio + 1, 1, 1));
+    END LOOP;
+END $$;
+
+-- Índice para las consultas por bounding box
+CREATE INDEX IF NOT EXISTS idx_sentinel2_lat_lon ON Sentinel2 (latitud, longitud);
\ No newline at end of file
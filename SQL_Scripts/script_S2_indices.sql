@@ -0,0 +1,11 @@
+-- Columnas generadas opcionales con los índices espectrales de Sentinel-2.
+-- Requiere PostgreSQL 12 o superior. Las expresiones son las mismas que usa
+-- Web/src/spectral_indices.py (ddl_columnas_generadas / flask indices-ddl).
+
+ALTER TABLE sentinel2 ADD COLUMN IF NOT EXISTS ndvi DOUBLE PRECISION GENERATED ALWAYS AS (((b8) - (b4)) / NULLIF((b8) + (b4), 0)) STORED;
+ALTER TABLE sentinel2 ADD COLUMN IF NOT EXISTS ndbi DOUBLE PRECISION GENERATED ALWAYS AS (((b11) - (b8)) / NULLIF((b11) + (b8), 0)) STORED;
+ALTER TABLE sentinel2 ADD COLUMN IF NOT EXISTS ndwi DOUBLE PRECISION GENERATED ALWAYS AS (((b3) - (b8)) / NULLIF((b3) + (b8), 0)) STORED;
+ALTER TABLE sentinel2 ADD COLUMN IF NOT EXISTS mndwi DOUBLE PRECISION GENERATED ALWAYS AS (((b3) - (b11)) / NULLIF((b3) + (b11), 0)) STORED;
+ALTER TABLE sentinel2 ADD COLUMN IF NOT EXISTS ndmi DOUBLE PRECISION GENERATED ALWAYS AS (((b8) - (b11)) / NULLIF((b8) + (b11), 0)) STORED;
+ALTER TABLE sentinel2 ADD COLUMN IF NOT EXISTS nbr DOUBLE PRECISION GENERATED ALWAYS AS (((b8) - (b12)) / NULLIF((b8) + (b12), 0)) STORED;
+ALTER TABLE sentinel2 ADD COLUMN IF NOT EXISTS bsi DOUBLE PRECISION GENERATED ALWAYS AS (((b11 + b4) - (b8 + b2)) / NULLIF((b11 + b4) + (b8 + b2), 0)) STORED;
\ No newline at end of file
@@ -0,0 +1,50 @@
+
+-- Si ya existen tablas con el mismo nombre y deseas usar este script:
+-- DROP TABLE IF EXISTS cambios_embedding;
+-- DROP TABLE IF EXISTS ejecuciones_cambios;
+
+-- Tablas de la detección incremental de cambios entre años consecutivos
+-- (Web/src/change_detection.py, flask cambios y /api/cambios). Iguales a los modelos
+-- CambioEmbedding y EjecucionCambios de Web/src/models. Requieren la columna
+-- xid_insercion de AlphaEarth (script_AEF.sql o, en una base de datos ya creada,
+-- script_xid_insercion.sql).
+
+-- Una puntuación de cambio por ubicación y año respecto al año anterior
+CREATE TABLE IF NOT EXISTS cambios_embedding (
+    id_cambio SERIAL PRIMARY KEY,
+
+    -- Coordenadas redondeadas a 5 decimales (~1 m) que identifican la ubicación entre años
+    lat_e5 INTEGER NOT NULL,
+    lon_e5 INTEGER NOT NULL,
+    latitud DOUBLE PRECISION NOT NULL,
+    longitud DOUBLE PRECISION NOT NULL,
+
+    anio_anterior INTEGER NOT NULL,
+    anio INTEGER NOT NULL,
+
+    -- Distancias entre los embeddings de AlphaEarth de los dos años
+    distancia_coseno DOUBLE PRECISION NOT NULL,
+    distancia_euclidea DOUBLE PRECISION NOT NULL,
+    es_cambio BOOLEAN NOT NULL,
+    fecha_calculo TIMESTAMP NOT NULL,
+
+    -- Permite recalcular con upsert (INSERT ... ON CONFLICT)
+    CONSTRAINT uq_cambios_ubicacion_anio UNIQUE (lat_e5, lon_e5, anio)
+);
+
+-- Índices para /api/cambios (por año y puntuación) y para las consultas por bounding box
+CREATE INDEX IF NOT EXISTS idx_cambios_anio_coseno ON cambios_embedding (anio, distancia_coseno);
+CREATE INDEX IF NOT EXISTS idx_cambios_lat_lon ON cambios_embedding (latitud, longitud);
+
+-- Una fila por ejecución; la última guarda hasta dónde se han procesado las filas de AlphaEarth
+CREATE TABLE IF NOT EXISTS ejecuciones_cambios (
+    id_ejecucion SERIAL PRIMARY KEY,
+
+    -- Las filas de AlphaEarth con xid_insercion menor ya están procesadas
+    horizonte_xid BIGINT NOT NULL,
+    umbral DOUBLE PRECISION NOT NULL,
+    metrica VARCHAR(15) NOT NULL,
+    pares_procesados INTEGER NOT NULL,
+    cambios_detectados INTEGER NOT NULL,
+    fecha TIMESTAMP NOT NULL
+);
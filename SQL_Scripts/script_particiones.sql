@@ -0,0 +1,81 @@
+-- Migración de una base de datos existente a tablas particionadas por año.
+-- Las tablas nuevas se crean con script_AEF.sql y script_S2.sql (iguales a los modelos
+-- de Web/src/models, que son los que usa db.create_all()); este script
+-- renombra las antiguas, copia los datos y conserva las secuencias de los ids.
+
+BEGIN;
+
+-- 1. Renombrar las tablas sin particionar (y sus índices)
+ALTER TABLE AlphaEarth RENAME TO alphaearth_sin_particionar;
+ALTER TABLE Sentinel2 RENAME TO sentinel2_sin_particionar;
+ALTER INDEX IF EXISTS idx_alphaearth_lat_lon RENAME TO idx_alphaearth_sin_particionar_lat_lon;
+ALTER INDEX IF EXISTS idx_sentinel2_lat_lon RENAME TO idx_sentinel2_sin_particionar_lat_lon;
+
+-- 2. Ejecutar aquí script_AEF.sql y script_S2.sql (tablas particionadas y particiones)
+-- (\ir: rutas relativas a este archivo, no al directorio desde el que se lanza psql)
+\ir script_AEF.sql
+\ir script_S2.sql
+
+-- Particiones de todos los años presentes en los datos antiguos, que pueden quedar
+-- fuera del rango creado por los scripts anteriores
+DO $$
+DECLARE
+    anio int;
+BEGIN
+    FOR anio IN SELECT generate_series(MIN(a.anio), MAX(a.anio)) FROM alphaearth_sin_particionar a LOOP
+        EXECUTE format('CREATE TABLE IF NOT EXISTS alphaearth_%s PARTITION OF AlphaEarth FOR VALUES FROM (%s) TO (%s)', anio, anio, anio + 1);
+    END LOOP;
+    FOR anio IN SELECT generate_series(MIN(EXTRACT(YEAR FROM s.fecha))::int, MAX(EXTRACT(YEAR FROM s.fecha))::int)
+                FROM sentinel2_sin_particionar s LOOP
+        EXECUTE format('CREATE TABLE IF NOT EXISTS sentinel2_%s PARTITION OF Sentinel2 FOR VALUES FROM (%L) TO (%L)', anio, make_date(anio, 1, 1), make_date(anio + 1, 1, 1));
+    END LOOP;
+END $$;
+
+-- 3. Copiar los datos: cada fila va a la partición de su año
+-- Las columnas se indican por nombre: las tablas antiguas pueden venir de db.create_all()
+-- o de una versión anterior de los scripts, con otro orden o con columnas generadas
+-- (si se aplicó script_S2_indices.sql, aplicarlo de nuevo tras la migración).
+-- Las tablas creadas con los scripts antiguos llamaban porcentaje_nubes a nubosidad.
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM information_schema.columns
+               WHERE table_name = 'sentinel2_sin_particionar' AND column_name = 'porcentaje_nubes') THEN
+        ALTER TABLE sentinel2_sin_particionar RENAME COLUMN porcentaje_nubes TO nubosidad;
+    END IF;
+END $$;
+
+INSERT INTO AlphaEarth (
+    id_coordenadaAEF, latitud, longitud, anio, es_residuo, tipo_residuo,
+    a00, a01, a02, a03, a04, a05, a06, a07, a08, a09, a10, a11, a12, a13, a14, a15,
+    a16, a17, a18, a19, a20, a21, a22, a23, a24, a25, a26, a27, a28, a29, a30, a31,
+    a32, a33, a34, a35, a36, a37, a38, a39, a40, a41, a42, a43, a44, a45, a46, a47,
+    a48, a49, a50, a51, a52, a53, a54, a55, a56, a57, a58, a59, a60, a61, a62, a63
+)
+SELECT
+    id_coordenadaAEF, latitud, longitud, anio, es_residuo, tipo_residuo,
+    a00, a01, a02, a03, a04, a05, a06, a07, a08, a09, a10, a11, a12, a13, a14, a15,
+    a16, a17, a18, a19, a20, a21, a22, a23, a24, a25, a26, a27, a28, a29, a30, a31,
+    a32, a33, a34, a35, a36, a37, a38, a39, a40, a41, a42, a43, a44, a45, a46, a47,
+    a48, a49, a50, a51, a52, a53, a54, a55, a56, a57, a58, a59, a60, a61, a62, a63
+FROM alphaearth_sin_particionar;
+
+INSERT INTO Sentinel2 (
+    id_sentinel2, latitud, longitud, fecha, es_residuo, tipo_residuo,
+    b1, b2, b3, b4, b5, b6, b7, b8, b8a, b9, b11, b12, nubosidad
+)
+SELECT
+    id_sentinel2, latitud, longitud, fecha, es_residuo, tipo_residuo,
+    b1, b2, b3, b4, b5, b6, b7, b8, b8a, b9, b11, b12, nubosidad
+FROM sentinel2_sin_particionar;
+
+-- 4. Continuar las secuencias de los ids desde el máximo copiado
+SELECT setval(pg_get_serial_sequence('alphaearth', 'id_coordenadaaef'),
+              COALESCE((SELECT MAX(id_coordenadaAEF) FROM AlphaEarth), 1));
+SELECT setval(pg_get_serial_sequence('sentinel2', 'id_sentinel2'),
+              COALESCE((SELECT MAX(id_sentinel2) FROM Sentinel2), 1));
+
+COMMIT;
+
+-- 5. Tras comprobar los datos, eliminar las tablas antiguas
+-- DROP TABLE alphaearth_sin_particionar;
+-- DROP TABLE sentinel2_sin_particionar;
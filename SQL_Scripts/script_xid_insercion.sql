@@ -0,0 +1,23 @@
+-- Migración de una base de datos existente para la detección incremental de cambios.
+-- Añade a AlphaEarth la columna xid_insercion (transacción que insertó la fila) y su
+-- índice, como en script_AEF.sql. Requiere PostgreSQL 13 o superior (pg_current_xact_id).
+-- Sin esta columna fallan todas las consultas del modelo AlphaEarth, también las de
+-- búsqueda y guardado de puntos. Se puede ejecutar más de una vez.
+
+BEGIN;
+
+-- 1. Las filas existentes toman 0: anteriores a cualquier ejecución, así que la primera
+--    ejecución de flask cambios las procesa todas. Un valor por defecto constante no
+--    reescribe la tabla (PostgreSQL 11+); el definitivo se asigna después.
+ALTER TABLE AlphaEarth ADD COLUMN IF NOT EXISTS xid_insercion BIGINT NOT NULL DEFAULT 0;
+
+-- 2. Las filas nuevas guardan la transacción que las inserta
+ALTER TABLE AlphaEarth ALTER COLUMN xid_insercion SET DEFAULT pg_current_xact_id()::text::bigint;
+
+-- 3. Índice para las filas nuevas (se crea también en cada partición)
+CREATE INDEX IF NOT EXISTS idx_alphaearth_xid_insercion ON AlphaEarth (xid_insercion);
+
+COMMIT;
+
+-- 4. Tablas de la detección de cambios, si todavía no existen
+\ir script_cambios.sql
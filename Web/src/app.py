@@ -1,31 +1,46 @@
 from flask import Flask, request, jsonify, render_template, redirect, url_for, flash
-from flask_login import LoginManager, login_user, logout_user, login_required
-from flask_wtf.csrf import CSRFProtect
+from flask_login import LoginManager, login_user, logout_user, login_required, current_user
+from flask_wtf.csrf import CSRFProtect, generate_csrf
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import and_
+from sqlalchemy import and_, func
 from config import config
 from database import init_db, get_db, close_db, commit_db, rollback_db
 from extensions import db, login_manager, csrf
 import os
+import click
+import numpy as np
 from dotenv import load_dotenv
 import ee
 
 # Models
-from models.ModelUser import ModelUser
+from models.ModelUser import ModelUser, LoginThrottled
+from models.ModelPoints import ModelPoints
 from models.AlphaEarth import AlphaEarth
 from models.Sentinel2 import Sentinel2
 
 # Entities
 from models.entities.User import User
 
+# Features
+from spectral_indices import validar_indices, calcular_indices_sentinel2, ddl_columnas_generadas
+from bulk_extraction import prefetch_region, contar_malla, tolerancia_malla
+from bulk_import import importar_puntos
+from responses import responder
+from partitions import init_particiones, asegurar_particiones, archivar_particion
+from change_detection import detectar_cambios, listar_cambios
+from pool_metrics import configurar_engine, metricas_pool, prueba_carga_pool
+
 app = Flask(__name__)
 
 # ==========================================
 # CONFIGURACIÓN DE LA APLICACIÓN
 # ==========================================
-# Cargar configuración desde config.py
-app.config.from_object(config['development'])
+# Cargar configuración desde config.py (FLASK_CONFIG: development, production o testing)
+app.config.from_object(config[os.getenv('FLASK_CONFIG', 'development')])
 init_db(app, db)
+with app.app_context():
+    configurar_engine(db.engine, app.config)
+init_particiones(app, db)
 
 # Inicializar extensiones con la app
 login_manager.init_app(app)
@@ -79,7 +94,11 @@ def login():
     """Maneja el login de usuarios."""
     if request.method == 'POST':
         user = User(0, username=request.form['username'], password_hash=request.form['password'])
-        logged_user = ModelUser().login(get_db(db), user)
+        try:
+            logged_user = ModelUser().login(get_db(db), user, origen=request.remote_addr)
+        except LoginThrottled:
+            flash("Too many login attempts, try again later", "danger")
+            return render_template('auth/login.html'), 429
         if logged_user != None:
             if logged_user.password_hash:
                 login_user(logged_user)
@@ -98,6 +117,7 @@ def login():
 @login_required
 def logout():
     """Cierra la sesión del usuario."""
+    ModelUser.invalidate(current_user.get_id())
     logout_user()
     return redirect(url_for('login'))
 
@@ -214,7 +234,8 @@ def extract_bands_sentinel2(lat, lon, year):
         }
     
 def search_alphaearth_and_save(db, lat, lon, year, es_residuo, tipo_residuo):
-    embeddings_data = extract_embedding(lat, lon, year)
+    # Usar el punto precargado más cercano si existe; si no, consultar Earth Engine
+    embeddings_data = search_cache_aef(lat, lon, year) or extract_embedding(lat, lon, year)
     
     if embeddings_data['status'] == 'success':
         nuevo_id = save_point_bbdd_aef(db, year, es_residuo, tipo_residuo, embeddings_data)
@@ -249,7 +270,8 @@ def search_alphaearth_and_save(db, lat, lon, year, es_residuo, tipo_residuo):
     return punto_existente_aef
 
 def search_sentinel2_and_save(db, lat, lon, year, es_residuo, tipo_residuo):
-    bands_data = extract_bands_sentinel2(lat, lon, year)
+    # Usar el punto precargado más cercano si existe; si no, consultar Earth Engine
+    bands_data = search_cache_sentinel2(lat, lon, year) or extract_bands_sentinel2(lat, lon, year)
     
     if bands_data['status'] == 'success':
         nuevo_id_s2 = save_point_sentinel2(db, lat, lon, es_residuo, tipo_residuo, bands_data)
@@ -259,13 +281,14 @@ def search_sentinel2_and_save(db, lat, lon, year, es_residuo, tipo_residuo):
             
             # Crear estructura de datos
             punto_existente_s2 = {
-                "id_coordenadaAEF": nuevo_id_s2,
+                "id_sentinel2": nuevo_id_s2,
                 "latitud": lat,
                 "longitud": lon,
                 "fecha": bands_data['fecha_imagen'],
                 "es_residuo": es_residuo,
                 "tipo_residuo": tipo_residuo,
-                "bandas": bands_data['bandas']
+                "bandas": bands_data['bandas'],
+                "nubosidad": bands_data['nubosidad']
             }
         else:
             # ERROR: No se pudo guardar Sentinel-2 en BD
@@ -379,6 +402,64 @@ def search_point_sentinel2(lat, lon, year, es_residuo, tipo_residuo, tolerancia=
         print(f"Error en search_point_sentinel2: {type(e).__name__}: {e}")
         return None
 
+def search_cache_aef(lat, lon, year):
+    """Busca el punto precargado (sin etiqueta) más cercano y lo devuelve como extract_embedding."""
+    try:
+        # Medio paso de la malla precargada; en longitud depende de la latitud
+        tolerancia_lat, tolerancia_lon = tolerancia_malla(lat, app.config['PREFETCH_ESPACIADO_MAX'])
+        escala_lon = tolerancia_lat / tolerancia_lon
+        resultado = AlphaEarth.query.filter(
+            AlphaEarth.latitud.between(lat - tolerancia_lat, lat + tolerancia_lat),
+            AlphaEarth.longitud.between(lon - tolerancia_lon, lon + tolerancia_lon),
+            AlphaEarth.anio == year,
+            AlphaEarth.tipo_residuo.is_(None)
+        ).order_by(
+            func.abs(AlphaEarth.latitud - lat) + func.abs(AlphaEarth.longitud - lon) * escala_lon
+        ).first()
+
+        if resultado is None:
+            return None
+
+        print(f"Embedding precargado encontrado para lat={lat}, lon={lon}, año={year}")
+        return {
+            "status": "success",
+            "embeddings": {f"a{i:02d}": getattr(resultado, f"a{i:02d}") for i in range(64)},
+            "punto": {"lat": lat, "lon": lon}
+        }
+    except Exception as e:
+        print(f"Error en search_cache_aef: {type(e).__name__}: {e}")
+        return None
+
+def search_cache_sentinel2(lat, lon, year):
+    """Busca el punto Sentinel-2 precargado más cercano y lo devuelve como extract_bands_sentinel2."""
+    try:
+        # Medio paso de la malla precargada; en longitud depende de la latitud
+        tolerancia_lat, tolerancia_lon = tolerancia_malla(lat, app.config['PREFETCH_ESPACIADO_MAX'])
+        escala_lon = tolerancia_lat / tolerancia_lon
+        columnas_bandas = ["b1", "b2", "b3", "b4", "b5", "b6", "b7", "b8", "b8a", "b9", "b11", "b12"]
+        resultado = Sentinel2.query.filter(
+            Sentinel2.latitud.between(lat - tolerancia_lat, lat + tolerancia_lat),
+            Sentinel2.longitud.between(lon - tolerancia_lon, lon + tolerancia_lon),
+            Sentinel2.fecha.between(f'{year}-01-01', f'{year}-12-31'),
+            Sentinel2.tipo_residuo.is_(None)
+        ).order_by(
+            func.abs(Sentinel2.latitud - lat) + func.abs(Sentinel2.longitud - lon) * escala_lon
+        ).first()
+
+        if resultado is None:
+            return None
+
+        print(f"Bandas Sentinel-2 precargadas encontradas para lat={lat}, lon={lon}, año={year}")
+        return {
+            "status": "success",
+            "bandas": {col: getattr(resultado, col) for col in columnas_bandas},
+            "fecha_imagen": resultado.fecha.isoformat(),
+            "nubosidad": resultado.nubosidad
+        }
+    except Exception as e:
+        print(f"Error en search_cache_sentinel2: {type(e).__name__}: {e}")
+        return None
+
 def save_point_bbdd_aef(db, year, es_residuo, tipo_residuo, embeddings_data):
     """Guarda un nuevo punto con embeddings en la base de datos."""
     try:
@@ -387,6 +468,10 @@ def save_point_bbdd_aef(db, year, es_residuo, tipo_residuo, embeddings_data):
         lat = embeddings_data['punto']['lat']
         lon = embeddings_data['punto']['lon']
 
+        # Terminar la transacción de lectura de la búsqueda antes de crear la partición
+        # (ver partitions.asegurar_particiones)
+        get_db(db).commit()
+        asegurar_particiones(db.engine, year)
         new_point = AlphaEarth(
             latitud=lat,
             longitud=lon,
@@ -414,7 +499,10 @@ def save_point_sentinel2(db, lat, lon, es_residuo, tipo_residuo, bands_data):
         nubosidad = bands_data['nubosidad']
 
         
-        # Guardar en la base de datos        
+        # Guardar en la base de datos (en la partición del año de la imagen), después de
+        # terminar la transacción de lectura de la búsqueda (ver partitions.asegurar_particiones)
+        get_db(db).commit()
+        asegurar_particiones(db.engine, str(fecha_imagen)[:4])
         new_point = Sentinel2(
             latitud=lat,
             longitud=lon,
@@ -433,6 +521,28 @@ def save_point_sentinel2(db, lat, lon, es_residuo, tipo_residuo, bands_data):
         print(f"Error al guardar punto Sentinel-2 en BBDD: {e}")
         return None
     
+def tabla_punto(punto_aef, punto_s2):
+    """Convierte un punto AlphaEarth + Sentinel-2 en una tabla columnar de una fila."""
+    columnas_embeddings = [f"a{i:02d}" for i in range(0, 64)]
+    columnas_bandas = ["b1", "b2", "b3", "b4", "b5", "b6", "b7", "b8", "b8a", "b9", "b11", "b12"]
+    return {
+        "id_coordenadaaef": [punto_aef['id_coordenadaAEF']],
+        "latitud": [punto_aef['latitud']],
+        "longitud": [punto_aef['longitud']],
+        "anio": [punto_aef['anio']],
+        "es_residuo": [punto_aef['es_residuo']],
+        "tipo_residuo": [punto_aef['tipo_residuo']],
+        "embedding": np.array(
+            [[punto_aef['embeddings'].get(col, np.nan) for col in columnas_embeddings]], dtype=np.float32
+        ),
+        "id_sentinel2": [punto_s2['id_sentinel2']],
+        "fecha": [str(punto_s2['fecha'])],
+        "bandas": np.array(
+            [[punto_s2['bandas'].get(col, np.nan) for col in columnas_bandas]], dtype=np.float32
+        ),
+        "nubosidad": [punto_s2.get('nubosidad')]
+    }
+
 def obtener_parametros(request):
     """ Obtiene y valida los parámetros de la URL."""
     # 1. OBTENER Y VALIDAR PARÁMETROS DE LA URL
@@ -477,29 +587,33 @@ def get_points_embedding():
         # 3. SI AMBOS EXISTEN EN BD, DEVOLVER INMEDIATAMENTE
         if punto_existente_aef and punto_existente_s2:
             print("Ambos puntos encontrados en BBDD, devolviendo datos existentes.")
-            # ✅ SUCCESS: Datos encontrados en BD
-            return jsonify({
-                "status": "success",
-                "user": user,
-                "data_aef": punto_existente_aef, 
-                "data_s2": punto_existente_s2
-            }), 200
 
         # 4. SI NO EXISTE AlphaEarth, EXTRAER Y GUARDAR
         if punto_existente_aef is None:
             punto_existente_aef = search_alphaearth_and_save(db, lat, lon, year, es_residuo, tipo_residuo)
+            if isinstance(punto_existente_aef, tuple):
+                # ❌ ERROR: Respuesta de error ya construida
+                return punto_existente_aef
 
         # 5. SI NO EXISTE Sentinel-2, EXTRAER Y GUARDAR
         if punto_existente_s2 is None:
             punto_existente_s2 = search_sentinel2_and_save(db, lat, lon, year, es_residuo, tipo_residuo)
+            if isinstance(punto_existente_s2, tuple):
+                return punto_existente_s2
+
         # 6. DEVOLVER RESPUESTA EXITOSA FINAL
-        # ✅ SUCCESS: Datos obtenidos (ya sea de BD o Earth Engine)
-        return jsonify({
-            "status": "success",
-            "user": user,
-            "data_aef": punto_existente_aef, 
-            "data_s2": punto_existente_s2
-        }), 200
+        # ✅ SUCCESS: Datos obtenidos (ya sea de BD o Earth Engine), en el formato negociado
+        return responder(
+            request,
+            tabla_punto(punto_existente_aef, punto_existente_s2),
+            {"status": "success", "user": user},
+            lambda: {
+                "status": "success",
+                "user": user,
+                "data_aef": punto_existente_aef,
+                "data_s2": punto_existente_s2
+            }
+        )
 
     except Exception as e:
         # ❌ ERROR: Excepción general no manejada
@@ -510,7 +624,479 @@ def get_points_embedding():
             "error": f"Error interno del servidor: {str(e)}"
         }), 500
 
-# --- 5. INICIO DEL SERVIDOR ---
+# --- 5. RUTA PARA LOS PUNTOS DEL MAPA ---
+def obtener_parametros_bbox(request):
+    """Obtiene y valida los parámetros del bounding box de la URL."""
+    # bbox con el formato de Leaflet: "oeste,sur,este,norte"
+    bbox = request.args.get('bbox', default='', type=str)
+    zoom = request.args.get('zoom', default=0, type=int)
+    year = request.args.get('year', default=None, type=int)
+    cursor = request.args.get('cursor', default=None, type=int)
+    limit = request.args.get('limit', default=app.config['MAPA_MAX_PUNTOS'], type=int)
+
+    try:
+        min_lon, min_lat, max_lon, max_lat = [float(valor) for valor in bbox.split(',')]
+    except ValueError:
+        # ❌ ERROR: bbox ausente o mal formado
+        return jsonify({
+            "status": "failed",
+            "error": "Se requiere el parámetro 'bbox' con el formato 'oeste,sur,este,norte'"
+        }), 400
+
+    if min_lon > max_lon or min_lat > max_lat:
+        return jsonify({
+            "status": "failed",
+            "error": "El parámetro 'bbox' tiene los límites invertidos"
+        }), 400
+
+    # Recortar a rangos válidos y limitar el tamaño de la respuesta
+    min_lon, max_lon = max(min_lon, -180.0), min(max_lon, 180.0)
+    min_lat, max_lat = max(min_lat, -90.0), min(max_lat, 90.0)
+    limit = max(1, min(limit, app.config['MAPA_MAX_PUNTOS']))
+
+    return (min_lon, min_lat, max_lon, max_lat), zoom, year, cursor, limit
+
+@app.route('/api/points/bbox', methods=['GET'])
+def get_points_bbox():
+    """
+    Obtiene los puntos etiquetados dentro de la vista del mapa como GeoJSON compacto.
+    Con zoom bajo (o con cluster=true) agrupa los puntos en una malla en el servidor;
+    con zoom alto devuelve los puntos individuales paginados por cursor. Con
+    embeddings=true incluye además los 64 valores de AlphaEarth de cada punto.
+
+    Returns:
+        JSON FeatureCollection (o MessagePack/Arrow columnar según la cabecera Accept)
+        con status "success", o JSON con status "failed"
+    """
+    try:
+        parametros = obtener_parametros_bbox(request)
+        if not isinstance(parametros[0], tuple):
+            return parametros
+        bbox, zoom, year, cursor, limit = parametros
+
+        # El mapa pide cluster=true cuando la vista tiene demasiados puntos para dibujarlos
+        agrupar = request.args.get('cluster', default='false', type=str).lower() == 'true'
+        if agrupar or zoom < app.config['MAPA_ZOOM_CLUSTER']:
+            # Celda en grados equivalente a 256 / MAPA_CELDAS_POR_TESELA píxeles en pantalla
+            tamano_celda = 360.0 / (2 ** max(zoom, 0)) / app.config['MAPA_CELDAS_POR_TESELA']
+            clusters = ModelPoints.get_clusters_in_bbox(
+                get_db(db), *bbox, tamano_celda, anio=year, limit=app.config['MAPA_MAX_CLUSTERS']
+            )
+            tabla = {
+                "latitud": [c.latitud for c in clusters],
+                "longitud": [c.longitud for c in clusters],
+                "total": [c.total for c in clusters],
+                "residuos": [int(c.residuos or 0) for c in clusters]
+            }
+
+            def features():
+                return [{
+                    "type": "Feature",
+                    "geometry": {"type": "Point", "coordinates": [round(c.longitud, 5), round(c.latitud, 5)]},
+                    "properties": {"cluster": True, "total": c.total, "residuos": int(c.residuos or 0)}
+                } for c in clusters]
+            siguiente = None
+        else:
+            incluir_embeddings = request.args.get('embeddings', default='false', type=str).lower() == 'true'
+            puntos, siguiente = ModelPoints.get_in_bbox(
+                get_db(db), *bbox, anio=year, cursor=cursor, limit=limit,
+                incluir_embeddings=incluir_embeddings
+            )
+            tabla = {
+                "id": [p.id_coordenadaaef for p in puntos],
+                "latitud": [p.latitud for p in puntos],
+                "longitud": [p.longitud for p in puntos],
+                "anio": [p.anio for p in puntos],
+                "es_residuo": [p.es_residuo for p in puntos],
+                "tipo_residuo": [p.tipo_residuo for p in puntos]
+            }
+            if incluir_embeddings:
+                # Matriz (puntos x 64) en float32 a partir de las columnas a00..a63
+                tabla["embedding"] = np.array([p[6:] for p in puntos], dtype=np.float32).reshape(len(puntos), 64)
+
+            def features():
+                return [{
+                    "type": "Feature",
+                    "geometry": {"type": "Point", "coordinates": [round(p.longitud, 5), round(p.latitud, 5)]},
+                    "properties": {
+                        "id": p.id_coordenadaaef,
+                        "anio": p.anio,
+                        "es_residuo": p.es_residuo,
+                        "tipo_residuo": p.tipo_residuo,
+                        **({"embedding": list(p[6:])} if incluir_embeddings else {})
+                    }
+                } for p in puntos]
+
+        # ✅ SUCCESS: GeoJSON con los puntos o clusters de la vista, en el formato negociado
+        return responder(
+            request,
+            tabla,
+            {"status": "success", "cluster": zoom < app.config['MAPA_ZOOM_CLUSTER'], "next_cursor": siguiente},
+            lambda: {
+                "status": "success",
+                "type": "FeatureCollection",
+                "features": features(),
+                "next_cursor": siguiente
+            }
+        )
+
+    except Exception as e:
+        # ❌ ERROR: Excepción general no manejada
+        print(f"Error al consultar puntos del mapa: {type(e).__name__}: {e}")
+        return jsonify({
+            "status": "failed",
+            "error": f"Error interno del servidor: {str(e)}"
+        }), 500
+
+# --- 6. RUTA PARA LOS ÍNDICES ESPECTRALES ---
+@app.route('/api/sentinel2/indices', methods=['GET'])
+def get_indices_sentinel2():
+    """
+    Calcula índices espectrales (NDVI, NDBI, NDWI, BSI...) sobre las bandas Sentinel-2
+    guardadas, en lote y con NumPy. Admite los mismos filtros que /api/points/bbox
+    (bbox opcional) y el parámetro 'indices' con la lista separada por comas.
+
+    Returns:
+        JSON columnar (o MessagePack/Arrow según la cabecera Accept) con status "success",
+        o JSON con status "failed"
+    """
+    try:
+        try:
+            indices = validar_indices(request.args.get('indices', default=None, type=str))
+        except ValueError as e:
+            return jsonify({"status": "failed", "error": str(e)}), 400
+
+        bbox = None
+        if request.args.get('bbox'):
+            parametros = obtener_parametros_bbox(request)
+            if not isinstance(parametros[0], tuple):
+                return parametros
+            bbox = parametros[0]
+
+        year = request.args.get('year', default=None, type=int)
+        cursor = request.args.get('cursor', default=None, type=int)
+        limit = request.args.get('limit', default=app.config['MAPA_MAX_PUNTOS'], type=int)
+        limit = max(1, min(limit, app.config['MAPA_MAX_PUNTOS']))
+
+        ids, valores, siguiente = calcular_indices_sentinel2(
+            get_db(db), indices, bbox=bbox, anio=year, cursor=cursor, limit=limit
+        )
+
+        def documento_json():
+            # JSON no admite NaN: los índices sin valor se devuelven como null
+            columnas = {}
+            for nombre, valor in valores.items():
+                columna = np.round(valor, 5).astype(object)
+                columna[np.isnan(valor)] = None
+                columnas[nombre] = columna.tolist()
+            return {
+                "status": "success",
+                "indices": indices,
+                "id_sentinel2": ids.tolist(),
+                "valores": columnas,
+                "next_cursor": siguiente
+            }
+
+        # ✅ SUCCESS: Índices calculados, en el formato negociado
+        return responder(
+            request,
+            {"id_sentinel2": ids, **valores},
+            {"status": "success", "indices": indices, "next_cursor": siguiente},
+            documento_json
+        )
+
+    except Exception as e:
+        # ❌ ERROR: Excepción general no manejada
+        print(f"Error al calcular índices espectrales: {type(e).__name__}: {e}")
+        return jsonify({
+            "status": "failed",
+            "error": f"Error interno del servidor: {str(e)}"
+        }), 500
+
+# --- 7. RUTA PARA PRECARGAR UNA REGIÓN ---
+@app.route('/api/csrf-token', methods=['GET'])
+@login_required
+def get_csrf_token():
+    """
+    Devuelve el token CSRF de la sesión para los clientes de la API. Las páginas lo
+    tienen en la meta etiqueta csrf-token; se envía en la cabecera X-CSRFToken.
+
+    Returns:
+        JSON con status "success" y el token
+    """
+    return jsonify({"status": "success", "csrf_token": generate_csrf()}), 200
+
+@app.route('/api/prefetch', methods=['POST'])
+@login_required
+def post_prefetch():
+    """
+    Precarga los embeddings de AlphaEarth y las bandas Sentinel-2 de una malla de puntos
+    sobre una región, con pocas llamadas masivas a Earth Engine. Los puntos se guardan
+    sin etiqueta y se reutilizan después en /api/alphaearth/points.
+
+    La petición espera a que termine la extracción, así que la malla se limita a
+    PREFETCH_MAX_PUNTOS_HTTP puntos (un lote); las regiones grandes se precargan con
+    el comando `flask prefetch`.
+
+    Parámetros: bbox ("oeste,sur,este,norte"), year y espaciado (metros, por defecto PREFETCH_ESPACIADO_MAX).
+    Como todos los POST, requiere el token CSRF en la cabecera X-CSRFToken (ver /api/csrf-token).
+
+    Returns:
+        JSON con status "success" y el resumen o JSON con status "failed"
+    """
+    try:
+        bbox = request.values.get('bbox', default='', type=str)
+        year = request.values.get('year', default=2024, type=int)
+        espaciado = request.values.get('espaciado', default=app.config['PREFETCH_ESPACIADO_MAX'], type=float)
+
+        try:
+            min_lon, min_lat, max_lon, max_lat = [float(valor) for valor in bbox.split(',')]
+        except ValueError:
+            return jsonify({
+                "status": "failed",
+                "error": "Se requiere el parámetro 'bbox' con el formato 'oeste,sur,este,norte'"
+            }), 400
+        if espaciado <= 0 or min_lon > max_lon or min_lat > max_lat:
+            return jsonify({
+                "status": "failed",
+                "error": "El bbox o el espaciado no son válidos"
+            }), 400
+
+        max_puntos = app.config['PREFETCH_MAX_PUNTOS_HTTP']
+        num_puntos = contar_malla(min_lon, min_lat, max_lon, max_lat, espaciado)
+        if num_puntos > max_puntos:
+            # ❌ ERROR: Región demasiado grande para una petición HTTP
+            return jsonify({
+                "status": "failed",
+                "error": f"La malla tiene {num_puntos} puntos y el máximo por petición es {max_puntos}; "
+                         "para regiones más grandes usa el comando 'flask prefetch'"
+            }), 400
+
+        resumen = prefetch_region(
+            get_db(db), (min_lon, min_lat, max_lon, max_lat), year, espaciado,
+            tamano_lote=app.config['PREFETCH_TAMANO_LOTE'],
+            max_puntos=max_puntos,
+            max_espaciado=app.config['PREFETCH_ESPACIADO_MAX']
+        )
+
+        # ✅ SUCCESS: Región precargada
+        return jsonify({"status": "success", **resumen}), 200
+
+    except ValueError as e:
+        # ❌ ERROR: Espaciado no admitido
+        return jsonify({"status": "failed", "error": str(e)}), 400
+    except Exception as e:
+        # ❌ ERROR: Excepción general no manejada
+        print(f"Error al precargar la región: {type(e).__name__}: {e}")
+        rollback_db(db)
+        return jsonify({
+            "status": "failed",
+            "error": f"Error interno del servidor: {str(e)}"
+        }), 500
+
+# --- 8. RUTAS DE DETECCIÓN DE CAMBIOS ---
+@app.route('/api/cambios/ejecutar', methods=['POST'])
+@login_required
+def post_detectar_cambios():
+    """
+    Ejecuta la detección de cambios entre años consecutivos sobre las filas de
+    AlphaEarth nuevas desde la última ejecución.
+
+    Parámetros: umbral y metrica ('coseno' o 'euclidea'), opcionales.
+    Requiere el token CSRF en la cabecera X-CSRFToken (ver /api/csrf-token).
+
+    Returns:
+        JSON con status "success" y el resumen o JSON con status "failed"
+    """
+    try:
+        umbral = request.values.get('umbral', default=app.config['CAMBIOS_UMBRAL'], type=float)
+        metrica = request.values.get('metrica', default=app.config['CAMBIOS_METRICA'], type=str)
+        resumen = detectar_cambios(get_db(db), umbral, metrica)
+
+        # ✅ SUCCESS: Cambios calculados
+        return jsonify({"status": "success", **resumen}), 200
+
+    except ValueError as e:
+        # ❌ ERROR: Métrica no válida
+        return jsonify({"status": "failed", "error": str(e)}), 400
+    except Exception as e:
+        # ❌ ERROR: Excepción general no manejada
+        print(f"Error al detectar cambios: {type(e).__name__}: {e}")
+        rollback_db(db)
+        return jsonify({
+            "status": "failed",
+            "error": f"Error interno del servidor: {str(e)}"
+        }), 500
+
+@app.route('/api/cambios', methods=['GET'])
+def get_cambios():
+    """
+    Obtiene las ubicaciones con cambio entre años, filtradas por bbox (opcional),
+    año y 'todos=true' para incluir también las que no superan el umbral.
+
+    Returns:
+        JSON (o MessagePack/Arrow según la cabecera Accept) con status "success",
+        o JSON con status "failed"
+    """
+    try:
+        bbox = None
+        if request.args.get('bbox'):
+            parametros = obtener_parametros_bbox(request)
+            if not isinstance(parametros[0], tuple):
+                return parametros
+            bbox = parametros[0]
+
+        year = request.args.get('year', default=None, type=int)
+        solo_cambios = request.args.get('todos', default='false', type=str).lower() != 'true'
+        cursor = request.args.get('cursor', default=None, type=int)
+        limit = request.args.get('limit', default=app.config['MAPA_MAX_PUNTOS'], type=int)
+        limit = max(1, min(limit, app.config['MAPA_MAX_PUNTOS']))
+
+        cambios, siguiente = listar_cambios(
+            get_db(db), bbox=bbox, anio=year, solo_cambios=solo_cambios, cursor=cursor, limit=limit
+        )
+
+        columnas = ['id_cambio', 'latitud', 'longitud', 'anio_anterior', 'anio',
+                    'distancia_coseno', 'distancia_euclidea', 'es_cambio']
+        tabla = {col: [getattr(c, col) for c in cambios] for col in columnas}
+
+        # ✅ SUCCESS: Cambios encontrados, en el formato negociado
+        return responder(
+            request,
+            tabla,
+            {"status": "success", "next_cursor": siguiente},
+            lambda: {
+                "status": "success",
+                "cambios": [{col: getattr(c, col) for col in columnas} for c in cambios],
+                "next_cursor": siguiente
+            }
+        )
+
+    except Exception as e:
+        # ❌ ERROR: Excepción general no manejada
+        print(f"Error al consultar cambios: {type(e).__name__}: {e}")
+        return jsonify({
+            "status": "failed",
+            "error": f"Error interno del servidor: {str(e)}"
+        }), 500
+
+@app.route('/api/metrics/pool', methods=['GET'])
+@login_required
+def get_metricas_pool():
+    """Devuelve el estado del pool de conexiones: en uso, overflow y tiempos de espera."""
+    return jsonify({"status": "success", **metricas_pool(db.engine)}), 200
+
+# --- 9. COMANDOS DE CONSOLA ---
+@app.cli.command('indices-ddl')
+@click.option('--indices', default=None, help='Índices separados por comas (por defecto, todos).')
+@click.option('--aplicar', is_flag=True, help='Ejecuta el DDL en la base de datos en lugar de mostrarlo.')
+def indices_ddl(indices, aplicar):
+    """Genera las columnas generadas de PostgreSQL con los índices espectrales."""
+    ddl = ddl_columnas_generadas(validar_indices(indices))
+    if not aplicar:
+        print(ddl)
+        return
+    with db.engine.begin() as conexion:
+        for sentencia in ddl.split('\n'):
+            conexion.exec_driver_sql(sentencia)
+    print("Columnas de índices espectrales creadas en la tabla sentinel2.")
+
+@app.cli.command('prefetch')
+@click.option('--bbox', required=True, help='Región con el formato "oeste,sur,este,norte".')
+@click.option('--year', default=2024, type=int, help='Año de los datos.')
+@click.option('--espaciado', default=None, type=float, help='Distancia entre puntos en metros (por defecto, PREFETCH_ESPACIADO_MAX).')
+def prefetch(bbox, year, espaciado):
+    """Precarga los embeddings y bandas Sentinel-2 de una región antes de etiquetarla."""
+    espaciado = espaciado or app.config['PREFETCH_ESPACIADO_MAX']
+    min_lon, min_lat, max_lon, max_lat = [float(valor) for valor in bbox.split(',')]
+    try:
+        resumen = prefetch_region(
+            get_db(db), (min_lon, min_lat, max_lon, max_lat), year, espaciado,
+            tamano_lote=app.config['PREFETCH_TAMANO_LOTE'],
+            max_puntos=app.config['PREFETCH_MAX_PUNTOS'],
+            max_espaciado=app.config['PREFETCH_ESPACIADO_MAX']
+        )
+    except Exception:
+        rollback_db(db)
+        raise
+    print(f"Prefetch completado: {resumen}")
+
+@app.cli.command('importar')
+@click.argument('archivo', type=click.Path(exists=True, dir_okay=False))
+@click.option('--formato', default='auto', type=click.Choice(['auto', 'csv', 'geojson', 'shapefile']), help='Formato del archivo (por defecto, según la extensión).')
+@click.option('--year', default=2024, type=int, help='Año de los puntos sin columna de año.')
+@click.option('--lote', default=None, type=int, help='Puntos por lote (por defecto, PREFETCH_TAMANO_LOTE).')
+@click.option('--checkpoint', default=None, help='Archivo de progreso (por defecto, ARCHIVO.checkpoint.json).')
+@click.option('--reiniciar', is_flag=True, help='Ignora el checkpoint y empieza desde el principio.')
+def importar(archivo, formato, year, lote, checkpoint, reiniciar):
+    """Importa puntos etiquetados desde un CSV, GeoJSON o Shapefile."""
+    try:
+        resumen = importar_puntos(
+            get_db(db), archivo, formato=formato, anio_defecto=year,
+            tamano_lote=lote or app.config['PREFETCH_TAMANO_LOTE'],
+            ruta_checkpoint=checkpoint or f"{archivo}.checkpoint.json",
+            reiniciar=reiniciar
+        )
+    except Exception:
+        rollback_db(db)
+        raise
+    print(f"Importación completada: {resumen}")
+
+@app.cli.command('cambios')
+@click.option('--umbral', default=None, type=float, help='Distancia a partir de la cual se marca un cambio.')
+@click.option('--metrica', default=None, type=click.Choice(['coseno', 'euclidea']), help='Métrica de distancia.')
+def cambios(umbral, metrica):
+    """Detecta cambios entre años consecutivos en los puntos nuevos desde la última ejecución."""
+    try:
+        resumen = detectar_cambios(
+            get_db(db),
+            umbral if umbral is not None else app.config['CAMBIOS_UMBRAL'],
+            metrica or app.config['CAMBIOS_METRICA']
+        )
+    except Exception:
+        rollback_db(db)
+        raise
+    print(f"Detección de cambios completada: {resumen}")
+
+@app.cli.command('pool-loadtest')
+@click.option('--tamanos', default='2,5,10,20', help='Tamaños de pool a comparar, separados por comas.')
+@click.option('--hilos', default=20, type=int, help='Peticiones concurrentes.')
+@click.option('--peticiones', default=500, type=int, help='Peticiones por tamaño de pool.')
+@click.option('--duracion', default=0.02, type=float, help='Segundos de cada consulta (pg_sleep).')
+def pool_loadtest(tamanos, hilos, peticiones, duracion):
+    """Mide la latencia p50/p99 con distintos tamaños de pool bajo la misma carga."""
+    opciones = {
+        clave: valor for clave, valor in app.config['SQLALCHEMY_ENGINE_OPTIONS'].items()
+        if clave in ('pool_timeout', 'pool_pre_ping', 'connect_args')
+    }
+    resultados = prueba_carga_pool(
+        app.config['SQLALCHEMY_DATABASE_URI'],
+        [int(tamano) for tamano in tamanos.split(',')],
+        hilos=hilos, peticiones=peticiones, duracion_consulta=duracion, opciones=opciones
+    )
+    print(f"{'pool':>5} {'pet/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'espera p99 ms':>14} {'timeouts':>9}")
+    for r in resultados:
+        print(f"{r['pool_size']:>5} {r['peticiones_por_segundo']:>8} {r['latencia_p50_ms']:>8} "
+              f"{r['latencia_p99_ms']:>8} {r['espera_p99_ms']:>14} {r['timeouts']:>9}")
+
+@app.cli.command('particiones-crear')
+@click.option('--desde', required=True, type=int, help='Primer año.')
+@click.option('--hasta', required=True, type=int, help='Último año (incluido).')
+def particiones_crear(desde, hasta):
+    """Crea las particiones anuales de AlphaEarth y Sentinel2 que falten."""
+    for anio in range(desde, hasta + 1):
+        asegurar_particiones(db.engine, anio)
+    print(f"Particiones comprobadas para los años {desde}-{hasta}.")
+
+@app.cli.command('particiones-archivar')
+@click.option('--anio', required=True, type=int, help='Año a separar de las tablas.')
+def particiones_archivar(anio):
+    """Separa las particiones de un año para exportarlas o eliminarlas."""
+    for tabla in ('alphaearth', 'sentinel2'):
+        archivada = archivar_particion(db.engine, tabla, anio)
+        print(f"Partición {anio} separada de {tabla} como {archivada}.")
+
+# --- 10. INICIO DEL SERVIDOR ---
 if __name__ == '__main__':
     try:
         app.register_error_handler(401, status_401)
@@ -0,0 +1,273 @@
+"""
+Extracción masiva de Earth Engine: muchos puntos por llamada en lugar de una llamada por punto.
+"""
+import math
+from datetime import date, datetime, timezone
+import numpy as np
+import ee
+from sqlalchemy import select, insert
+from models.AlphaEarth import AlphaEarth
+from models.Sentinel2 import Sentinel2
+from partitions import asegurar_particiones
+
+BANDAS_SENTINEL2 = ['B1', 'B2', 'B3', 'B4', 'B5', 'B6', 'B7', 'B8', 'B8A', 'B9', 'B11', 'B12']
+
+# Decimales con los que se guardan y comparan las coordenadas de la malla (~0,1 m)
+DECIMALES_MALLA = 6
+
+# Metros por grado de latitud (aproximación esférica usada para la malla)
+METROS_POR_GRADO = 111320.0
+
+def generar_malla(min_lon, min_lat, max_lon, max_lat, espaciado):
+    """
+    Genera una malla regular de puntos dentro de un bounding box.
+
+    Args:
+        min_lon, min_lat, max_lon, max_lat: Límites del bounding box (WGS84)
+        espaciado: Distancia entre puntos en metros
+
+    Returns:
+        tuple: (array de latitudes, array de longitudes)
+    """
+    # Conversión aproximada de metros a grados en la latitud central
+    paso_lat, paso_lon = metros_a_grados(espaciado, (min_lat + max_lat) / 2)
+
+    lats = np.round(np.arange(min_lat, max_lat + paso_lat / 2, paso_lat), DECIMALES_MALLA)
+    lons = np.round(np.arange(min_lon, max_lon + paso_lon / 2, paso_lon), DECIMALES_MALLA)
+    # Descartar el último paso si se sale de la región
+    lats = lats[lats <= max_lat]
+    lons = lons[lons <= max_lon]
+    malla_lon, malla_lat = np.meshgrid(lons, lats)
+    return malla_lat.ravel(), malla_lon.ravel()
+
+def contar_malla(min_lon, min_lat, max_lon, max_lat, espaciado):
+    """
+    Número de puntos que tendría la malla de generar_malla, sin generarla
+    (para rechazar regiones demasiado grandes antes de reservar la memoria).
+    """
+    paso_lat, paso_lon = metros_a_grados(espaciado, (min_lat + max_lat) / 2)
+    filas = math.floor((max_lat - min_lat) / paso_lat + 1e-9) + 1
+    columnas = math.floor((max_lon - min_lon) / paso_lon + 1e-9) + 1
+    return filas * columnas
+
+def metros_a_grados(metros, lat):
+    """
+    Convierte una distancia en metros a grados de latitud y de longitud en una latitud.
+
+    Returns:
+        tuple: (grados de latitud, grados de longitud)
+    """
+    grados_lat = metros / METROS_POR_GRADO
+    return grados_lat, grados_lat / max(math.cos(math.radians(lat)), 1e-6)
+
+def tolerancia_malla(lat, espaciado):
+    """
+    Distancia máxima (grados de latitud y de longitud) entre un punto y el punto más
+    cercano de una malla con el espaciado dado: medio paso en cada eje, con un 1% de
+    margen por la variación de latitud dentro de la región y el redondeo de la malla.
+    """
+    tolerancia_lat, tolerancia_lon = metros_a_grados(espaciado / 2, lat)
+    return tolerancia_lat * 1.01, tolerancia_lon * 1.01
+
+def _coleccion_puntos(lats, lons):
+    """Crea una FeatureCollection de Earth Engine con un índice por punto."""
+    return ee.FeatureCollection([
+        ee.Feature(ee.Geometry.Point([float(lon), float(lat)]), {'idx': i})
+        for i, (lat, lon) in enumerate(zip(lats, lons))
+    ])
+
+def extract_embeddings_bulk(lats, lons, year):
+    """
+    Extrae los embeddings de AlphaEarth de un lote de puntos en una sola llamada.
+
+    Args:
+        lats, lons: Secuencias con las coordenadas del lote (máximo 5000 puntos por llamada)
+        year: Año de los embeddings
+
+    Returns:
+        list: Diccionario de embeddings por punto, o None si el punto no tiene datos
+    """
+    puntos = _coleccion_puntos(lats, lons)
+    embeddings = ee.ImageCollection('GOOGLE/SATELLITE_EMBEDDING/V1/ANNUAL')
+    mosaic = embeddings.filterDate(f'{year}-01-01', f'{year + 1}-01-01').mosaic()
+
+    muestras = mosaic.sampleRegions(collection=puntos, properties=['idx'], scale=10).getInfo()
+
+    resultado = [None] * len(lats)
+    for feature in muestras['features']:
+        valores = {key.lower(): value for key, value in feature['properties'].items()}
+        idx = valores.pop('idx')
+        resultado[idx] = valores
+    return resultado
+
+def extract_bands_sentinel2_bulk(lats, lons, year):
+    """
+    Extrae las bandas Sentinel-2 de un lote de puntos en una sola llamada.
+    Para cada punto usa la imagen del año con menos nubosidad (< 5%) que lo cubre.
+
+    Args:
+        lats, lons: Secuencias con las coordenadas del lote (máximo 5000 puntos por llamada)
+        year: Año de las imágenes
+
+    Returns:
+        list: Diccionario con "bandas", "fecha_imagen" y "nubosidad" por punto, o None
+    """
+    puntos = _coleccion_puntos(lats, lons)
+
+    def anadir_metadatos(imagen):
+        # Fecha y nubosidad como bandas para conservarlas en el mosaico. Se enmascaran con
+        # la huella de la imagen: una constante sin máscara cubriría todo el mosaico y la
+        # fecha de la imagen superior se asignaría a píxeles que aporta otra imagen
+        huella = imagen.select('B2').mask()
+        fecha = ee.Image.constant(imagen.get('system:time_start')).toDouble().rename('fecha')
+        nubes = ee.Image.constant(imagen.get('CLOUDY_PIXEL_PERCENTAGE')).toDouble().rename('nubosidad')
+        return imagen.select(BANDAS_SENTINEL2).addBands(
+            ee.Image.cat([fecha, nubes]).updateMask(huella)
+        )
+
+    # Orden descendente: en el mosaico queda encima la imagen con menos nubes
+    mosaic = ee.ImageCollection('COPERNICUS/S2_SR_HARMONIZED') \
+        .filterDate(f'{year}-01-01', f'{year}-12-31') \
+        .filterBounds(puntos.geometry().bounds()) \
+        .filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', 5)) \
+        .sort('CLOUDY_PIXEL_PERCENTAGE', False) \
+        .map(anadir_metadatos) \
+        .mosaic()
+
+    muestras = mosaic.sampleRegions(collection=puntos, properties=['idx'], scale=10).getInfo()
+
+    resultado = [None] * len(lats)
+    for feature in muestras['features']:
+        valores = {key.lower(): value for key, value in feature['properties'].items()}
+        idx = valores.pop('idx')
+        fecha = datetime.fromtimestamp(valores.pop('fecha') / 1000, tz=timezone.utc)
+        nubosidad = valores.pop('nubosidad')
+        resultado[idx] = {
+            "bandas": valores,
+            "fecha_imagen": fecha.strftime('%Y-%m-%d'),
+            "nubosidad": nubosidad
+        }
+    return resultado
+
+def _claves_existentes(db_session, columnas, filtros):
+    """Devuelve las coordenadas ya guardadas que cumplen los filtros, en una única consulta."""
+    filas = db_session.execute(select(*columnas).where(*filtros)).all()
+    return {(round(lat, DECIMALES_MALLA), round(lon, DECIMALES_MALLA)) for lat, lon in filas}
+
+def guardar_aef_bulk(db_session, puntos, year):
+    """
+    Extrae de Earth Engine los embeddings de un lote de puntos y los inserta en bloque.
+
+    Args:
+        db_session: Sesión de SQLAlchemy (db.session)
+        puntos: Lista de diccionarios con latitud, longitud, es_residuo y tipo_residuo
+        year: Año de los embeddings
+
+    Returns:
+        int: Número de filas insertadas (los puntos sin datos se omiten)
+    """
+    embeddings = extract_embeddings_bulk([p['latitud'] for p in puntos], [p['longitud'] for p in puntos], year)
+    filas = [dict(p, anio=year, **valores) for p, valores in zip(puntos, embeddings) if valores]
+    if filas:
+        db_session.execute(insert(AlphaEarth), filas)
+    return len(filas)
+
+def guardar_sentinel2_bulk(db_session, puntos, year):
+    """
+    Extrae de Earth Engine las bandas Sentinel-2 de un lote de puntos y las inserta en bloque.
+
+    Args:
+        db_session: Sesión de SQLAlchemy (db.session)
+        puntos: Lista de diccionarios con latitud, longitud, es_residuo y tipo_residuo
+        year: Año de las imágenes
+
+    Returns:
+        int: Número de filas insertadas (los puntos sin imagen se omiten)
+    """
+    bandas = extract_bands_sentinel2_bulk([p['latitud'] for p in puntos], [p['longitud'] for p in puntos], year)
+    filas = [
+        dict(p, fecha=date.fromisoformat(datos['fecha_imagen']), nubosidad=datos['nubosidad'], **datos['bandas'])
+        for p, datos in zip(puntos, bandas) if datos
+    ]
+    if filas:
+        db_session.execute(insert(Sentinel2), filas)
+    return len(filas)
+
+def prefetch_region(db_session, bbox, year, espaciado, tamano_lote=5000, max_puntos=50000, max_espaciado=None):
+    """
+    Precarga en la base de datos los embeddings y bandas de una malla sobre una región.
+    Los puntos se guardan sin etiqueta (tipo_residuo NULL) y solo se piden a Earth
+    Engine los que todavía no estén guardados.
+
+    Args:
+        db_session: Sesión de SQLAlchemy (db.session)
+        bbox: Tupla (oeste, sur, este, norte)
+        year: Año de los datos
+        espaciado: Distancia entre puntos de la malla en metros
+        tamano_lote: Puntos por llamada a Earth Engine
+        max_puntos: Número máximo de puntos de la malla
+        max_espaciado: Espaciado máximo en metros (el de la búsqueda en la caché; opcional)
+
+    Returns:
+        dict: Resumen con los puntos de la malla y los guardados en cada tabla
+    """
+    if max_espaciado is not None and espaciado > max_espaciado:
+        raise ValueError(
+            f"El espaciado máximo es {max_espaciado} m; con más distancia la búsqueda en la caché no encontraría los puntos"
+        )
+    min_lon, min_lat, max_lon, max_lat = bbox
+    num_puntos = contar_malla(min_lon, min_lat, max_lon, max_lat, espaciado)
+    if num_puntos > max_puntos:
+        raise ValueError(
+            f"La malla tiene {num_puntos} puntos y el máximo es {max_puntos}; aumenta el espaciado o reduce la región"
+        )
+    lats, lons = generar_malla(min_lon, min_lat, max_lon, max_lat, espaciado)
+
+    # Antes de cualquier consulta de la sesión (ver partitions.asegurar_particiones)
+    asegurar_particiones(db_session.get_bind(), year)
+
+    # Puntos sin etiqueta ya precargados en la región, en una consulta por tabla
+    # (con un margen por el redondeo de las coordenadas de la malla)
+    margen = 10 ** -DECIMALES_MALLA
+    min_lon, min_lat, max_lon, max_lat = min_lon - margen, min_lat - margen, max_lon + margen, max_lat + margen
+    existentes_aef = _claves_existentes(db_session, [AlphaEarth.latitud, AlphaEarth.longitud], [
+        AlphaEarth.latitud.between(min_lat, max_lat),
+        AlphaEarth.longitud.between(min_lon, max_lon),
+        AlphaEarth.anio == year,
+        AlphaEarth.tipo_residuo.is_(None)
+    ])
+    existentes_s2 = _claves_existentes(db_session, [Sentinel2.latitud, Sentinel2.longitud], [
+        Sentinel2.latitud.between(min_lat, max_lat),
+        Sentinel2.longitud.between(min_lon, max_lon),
+        Sentinel2.fecha.between(f'{year}-01-01', f'{year}-12-31'),
+        Sentinel2.tipo_residuo.is_(None)
+    ])
+
+    guardados_aef = 0
+    guardados_s2 = 0
+    for inicio in range(0, len(lats), tamano_lote):
+        lote = list(zip(lats[inicio:inicio + tamano_lote].tolist(), lons[inicio:inicio + tamano_lote].tolist()))
+
+        pendientes = [
+            dict(latitud=lat, longitud=lon, es_residuo=False, tipo_residuo=None)
+            for lat, lon in lote if (lat, lon) not in existentes_aef
+        ]
+        if pendientes:
+            guardados_aef += guardar_aef_bulk(db_session, pendientes, year)
+
+        pendientes = [
+            dict(latitud=lat, longitud=lon, es_residuo=False, tipo_residuo=None)
+            for lat, lon in lote if (lat, lon) not in existentes_s2
+        ]
+        if pendientes:
+            guardados_s2 += guardar_sentinel2_bulk(db_session, pendientes, year)
+
+        # Confirmar cada lote para no perder el trabajo hecho si falla una llamada posterior
+        db_session.commit()
+        print(f"Prefetch: {min(inicio + tamano_lote, len(lats))}/{len(lats)} puntos procesados")
+
+    return {
+        "puntos_malla": len(lats),
+        "guardados_aef": guardados_aef,
+        "guardados_s2": guardados_s2
+    }
@@ -0,0 +1,288 @@
+"""
+Importación por lotes de puntos etiquetados desde CSV, GeoJSON o Shapefile.
+Lee el archivo por partes, descarta los puntos ya guardados con una consulta por lote
+y extrae de Earth Engine solo los que faltan, con inserciones en bloque y checkpoints.
+"""
+import csv
+import json
+import os
+import time
+from itertools import islice
+from sqlalchemy import select, func, or_, cast, tuple_, Integer, BigInteger
+from models.AlphaEarth import AlphaEarth
+from models.Sentinel2 import Sentinel2
+from partitions import asegurar_particiones
+from bulk_extraction import guardar_aef_bulk, guardar_sentinel2_bulk, DECIMALES_MALLA
+
+# Dependencias opcionales: si no están instaladas el formato no se puede leer
+# (sin ijson el GeoJSON se carga entero en memoria)
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+try:
+    import shapefile
+except ImportError:
+    shapefile = None
+
+FORMATOS = {
+    '.csv': 'csv',
+    '.geojson': 'geojson',
+    '.json': 'geojson',
+    '.shp': 'shapefile'
+}
+
+# Nombres de columna aceptados (en minúsculas) para cada campo
+COLUMNAS_LATITUD = ('latitud', 'lat', 'latitude', 'y')
+COLUMNAS_LONGITUD = ('longitud', 'lon', 'lng', 'longitude', 'x')
+COLUMNAS_ANIO = ('anio', 'year', 'año')
+COLUMNAS_RESIDUO = ('tipo_residuo', 'tipo_resid', 'residuo')
+
+# Las coordenadas se comparan como enteros redondeados a DECIMALES_MALLA decimales
+FACTOR_CLAVE = 10 ** DECIMALES_MALLA
+
+def _campo(propiedades, nombres):
+    """Devuelve el primer campo presente y no vacío de los nombres aceptados."""
+    for nombre in nombres:
+        valor = propiedades.get(nombre)
+        if valor not in (None, ''):
+            return valor
+    return None
+
+def _minusculas(propiedades):
+    return {str(clave).strip().lower(): valor for clave, valor in (propiedades or {}).items()}
+
+def _leer_csv(ruta):
+    """Devuelve (longitud, latitud, propiedades) por fila del CSV."""
+    with open(ruta, newline='', encoding='utf-8-sig') as archivo:
+        for fila in csv.DictReader(archivo):
+            propiedades = _minusculas(fila)
+            yield _campo(propiedades, COLUMNAS_LONGITUD), _campo(propiedades, COLUMNAS_LATITUD), propiedades
+
+def _leer_geojson(ruta):
+    """Devuelve (longitud, latitud, propiedades) por feature del GeoJSON."""
+    with open(ruta, 'rb') as archivo:
+        if ijson is not None:
+            features = ijson.items(archivo, 'features.item')
+        else:
+            features = json.load(archivo).get('features', [])
+        for feature in features:
+            geometria = feature.get('geometry') or {}
+            coordenadas = geometria.get('coordinates') if geometria.get('type') == 'Point' else None
+            lon, lat = coordenadas[:2] if coordenadas else (None, None)
+            yield lon, lat, _minusculas(feature.get('properties'))
+
+def _leer_shapefile(ruta):
+    """Devuelve (longitud, latitud, propiedades) por registro del Shapefile."""
+    if shapefile is None:
+        raise ValueError("Para leer Shapefiles hay que instalar pyshp")
+    with shapefile.Reader(ruta) as lector:
+        for registro in lector.iterShapeRecords():
+            puntos = registro.shape.points
+            lon, lat = puntos[0][:2] if len(puntos) == 1 else (None, None)
+            yield lon, lat, _minusculas(registro.record.as_dict())
+
+LECTORES = {
+    'csv': _leer_csv,
+    'geojson': _leer_geojson,
+    'shapefile': _leer_shapefile
+}
+
+def _normalizar(lon, lat, propiedades, anio_defecto):
+    """
+    Convierte un registro del archivo en un punto con el mismo criterio que la API
+    (tipo_residuo 'Ninguno' = no residuo). Devuelve None si las coordenadas no son válidas.
+    """
+    try:
+        lat = round(float(lat), DECIMALES_MALLA)
+        lon = round(float(lon), DECIMALES_MALLA)
+        anio = int(float(_campo(propiedades, COLUMNAS_ANIO) or anio_defecto))
+    except (TypeError, ValueError):
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None
+    tipo_residuo = str(_campo(propiedades, COLUMNAS_RESIDUO) or 'Ninguno').strip()
+    return {
+        "latitud": lat,
+        "longitud": lon,
+        "anio": anio,
+        "es_residuo": tipo_residuo.lower() != 'ninguno',
+        "tipo_residuo": tipo_residuo
+    }
+
+def detectar_formato(ruta, formato='auto'):
+    """Devuelve el formato del archivo a partir de su extensión si no se indica."""
+    if formato != 'auto':
+        if formato not in LECTORES:
+            raise ValueError(f"Formato desconocido: {formato}. Disponibles: {', '.join(LECTORES)}")
+        return formato
+    extension = os.path.splitext(ruta)[1].lower()
+    if extension not in FORMATOS:
+        raise ValueError(f"No se reconoce la extensión {extension}; indica el formato")
+    return FORMATOS[extension]
+
+def _filtro_anios_aef(anios):
+    return AlphaEarth.anio.in_(anios)
+
+def _filtro_anios_s2(anios):
+    # Rangos de fecha (no EXTRACT) para que PostgreSQL descarte particiones y use los índices
+    return or_(*[Sentinel2.fecha.between(f'{anio}-01-01', f'{anio}-12-31') for anio in sorted(anios)])
+
+def _clave(punto):
+    """Clave de un punto: coordenadas enteras (en millonésimas de grado), año y tipo de residuo."""
+    return (
+        int(round(punto['latitud'] * FACTOR_CLAVE)),
+        int(round(punto['longitud'] * FACTOR_CLAVE)),
+        punto['anio'],
+        punto['tipo_residuo']
+    )
+
+def _claves_existentes(db_session, modelo, columna_anio, filtro_anios, puntos):
+    """
+    Devuelve las claves de los puntos del lote que ya están guardadas, con una única
+    consulta que compara las claves exactas del lote (el bbox y los años del lote solo
+    sirven para que PostgreSQL use el índice y descarte particiones).
+    """
+    margen = 1 / FACTOR_CLAVE
+    lats = [p['latitud'] for p in puntos]
+    lons = [p['longitud'] for p in puntos]
+    lat_e6 = cast(func.round(modelo.latitud * FACTOR_CLAVE), BigInteger)
+    lon_e6 = cast(func.round(modelo.longitud * FACTOR_CLAVE), BigInteger)
+    filas = db_session.execute(
+        select(lat_e6, lon_e6, columna_anio, modelo.tipo_residuo).where(
+            modelo.latitud.between(min(lats) - margen, max(lats) + margen),
+            modelo.longitud.between(min(lons) - margen, max(lons) + margen),
+            filtro_anios({p['anio'] for p in puntos}),
+            tuple_(lat_e6, lon_e6, columna_anio, modelo.tipo_residuo).in_([_clave(p) for p in puntos])
+        )
+    ).all()
+    return {(int(lat), int(lon), int(anio), tipo) for lat, lon, anio, tipo in filas}
+
+def _guardar_pendientes(db_session, puntos, existentes, guardar):
+    """Guarda, agrupados por año, los puntos cuya clave no está en existentes."""
+    por_anio = {}
+    for punto in puntos:
+        if _clave(punto) not in existentes:
+            datos = {k: punto[k] for k in ('latitud', 'longitud', 'es_residuo', 'tipo_residuo')}
+            por_anio.setdefault(punto['anio'], []).append(datos)
+    guardados = 0
+    for anio, pendientes in sorted(por_anio.items()):
+        guardados += guardar(db_session, pendientes, anio)
+    return guardados, sum(len(p) for p in por_anio.values())
+
+def _leer_checkpoint(ruta_checkpoint, ruta):
+    if not ruta_checkpoint or not os.path.exists(ruta_checkpoint):
+        return None
+    with open(ruta_checkpoint, encoding='utf-8') as archivo:
+        estado = json.load(archivo)
+    if estado.get('archivo') != os.path.abspath(ruta):
+        raise ValueError(f"El checkpoint {ruta_checkpoint} corresponde a otro archivo: {estado.get('archivo')}")
+    return estado
+
+def _guardar_checkpoint(ruta_checkpoint, estado):
+    """Escribe el checkpoint de forma atómica (un corte a mitad no lo deja corrupto)."""
+    temporal = f"{ruta_checkpoint}.tmp"
+    with open(temporal, 'w', encoding='utf-8') as archivo:
+        json.dump(estado, archivo, indent=2)
+    os.replace(temporal, ruta_checkpoint)
+
+def importar_puntos(db_session, ruta, formato='auto', anio_defecto=2024, tamano_lote=5000,
+                    ruta_checkpoint=None, reiniciar=False):
+    """
+    Importa los puntos etiquetados de un archivo en AlphaEarth y Sentinel2.
+
+    Args:
+        db_session: Sesión de SQLAlchemy (db.session)
+        ruta: Ruta del archivo CSV, GeoJSON o Shapefile
+        formato: 'auto', 'csv', 'geojson' o 'shapefile'
+        anio_defecto: Año de los puntos sin columna de año
+        tamano_lote: Puntos leídos, consultados y extraídos de Earth Engine por lote
+        ruta_checkpoint: Archivo JSON donde se guarda el progreso; se borra al terminar (opcional)
+        reiniciar: Si es True ignora el checkpoint existente y empieza desde el principio
+
+    Returns:
+        dict: Resumen con los puntos leídos, descartados, ya existentes y guardados
+    """
+    lector = LECTORES[detectar_formato(ruta, formato)]
+
+    estado = None if reiniciar else _leer_checkpoint(ruta_checkpoint, ruta)
+    if estado is None:
+        estado = {
+            "archivo": os.path.abspath(ruta),
+            "filas_procesadas": 0,
+            "descartados": 0,
+            "existentes_aef": 0,
+            "existentes_s2": 0,
+            "guardados_aef": 0,
+            "guardados_s2": 0,
+            "sin_datos": 0,
+            "segundos": 0.0
+        }
+    elif estado['filas_procesadas']:
+        print(f"Reanudando la importación desde la fila {estado['filas_procesadas']}")
+
+    registros = islice(lector(ruta), estado['filas_procesadas'], None)
+    inicio_importacion = time.perf_counter()
+    segundos_previos = estado['segundos']
+
+    while True:
+        lote = list(islice(registros, tamano_lote))
+        if not lote:
+            break
+        inicio = time.perf_counter()
+
+        # Normalizar y quitar duplicados dentro del propio lote
+        puntos = {}
+        for lon, lat, propiedades in lote:
+            punto = _normalizar(lon, lat, propiedades, anio_defecto)
+            if punto is None:
+                estado['descartados'] += 1
+            else:
+                puntos.setdefault(_clave(punto), punto)
+        puntos = list(puntos.values())
+
+        if puntos:
+            for anio in {p['anio'] for p in puntos}:
+                asegurar_particiones(db_session.get_bind(), anio)
+
+            # Un punto repetido en lotes anteriores ya está en la BD y lo filtra esta consulta
+            existentes_aef = _claves_existentes(
+                db_session, AlphaEarth, AlphaEarth.anio, _filtro_anios_aef, puntos
+            )
+            existentes_s2 = _claves_existentes(
+                db_session, Sentinel2, cast(func.extract('year', Sentinel2.fecha), Integer), _filtro_anios_s2, puntos
+            )
+            guardados_aef, pendientes_aef = _guardar_pendientes(
+                db_session, puntos, existentes_aef, guardar_aef_bulk
+            )
+            guardados_s2, pendientes_s2 = _guardar_pendientes(
+                db_session, puntos, existentes_s2, guardar_sentinel2_bulk
+            )
+            db_session.commit()
+
+            estado['existentes_aef'] += len(puntos) - pendientes_aef
+            estado['existentes_s2'] += len(puntos) - pendientes_s2
+            estado['guardados_aef'] += guardados_aef
+            estado['guardados_s2'] += guardados_s2
+            estado['sin_datos'] += (pendientes_aef - guardados_aef) + (pendientes_s2 - guardados_s2)
+
+        # El checkpoint se escribe después del commit: al reanudar no se pierde ni repite ningún lote
+        estado['filas_procesadas'] += len(lote)
+        estado['segundos'] = round(segundos_previos + time.perf_counter() - inicio_importacion, 3)
+        if ruta_checkpoint:
+            _guardar_checkpoint(ruta_checkpoint, estado)
+
+        duracion = time.perf_counter() - inicio
+        print(f"Importación: {estado['filas_procesadas']} filas procesadas "
+              f"({len(lote) / duracion:.1f} puntos/s en el último lote)")
+
+    # Importación terminada: el checkpoint ya no hace falta
+    if ruta_checkpoint and os.path.exists(ruta_checkpoint):
+        os.remove(ruta_checkpoint)
+
+    resumen = {clave: valor for clave, valor in estado.items() if clave != 'archivo'}
+    resumen['puntos_por_segundo'] = (
+        round(estado['filas_procesadas'] / estado['segundos'], 1) if estado['segundos'] else 0.0
+    )
+    return resumen
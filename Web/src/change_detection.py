@@ -0,0 +1,210 @@
+"""
+Detección de cambios entre años consecutivos a partir de los embeddings anuales de AlphaEarth.
+"""
+import numpy as np
+from sqlalchemy import select, func, cast, Integer, BigInteger, Text, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from models.AlphaEarth import AlphaEarth
+from models.CambioEmbedding import CambioEmbedding
+from models.EjecucionCambios import EjecucionCambios
+
+COLUMNAS_EMBEDDING = [f"a{i:02d}" for i in range(64)]
+METRICAS = ('coseno', 'euclidea')
+
+# Una ubicación se identifica por sus coordenadas redondeadas a 5 decimales (~1 m)
+FACTOR_CLAVE = 100000
+
+def _clave(columna):
+    """Expresión SQL con la coordenada redondeada a entero (lat_e5 / lon_e5)."""
+    return cast(func.round(columna * FACTOR_CLAVE), Integer)
+
+def distancias(anteriores, actuales):
+    """
+    Calcula las distancias entre dos matrices de embeddings fila a fila.
+
+    Args:
+        anteriores: Matriz (n x 64) con los embeddings del año anterior
+        actuales: Matriz (n x 64) con los embeddings del año siguiente
+
+    Returns:
+        tuple: (distancia coseno, distancia euclídea), arrays de longitud n
+    """
+    anteriores = np.asarray(anteriores, dtype=np.float64)
+    actuales = np.asarray(actuales, dtype=np.float64)
+    producto = np.einsum('ij,ij->i', anteriores, actuales)
+    normas = np.linalg.norm(anteriores, axis=1) * np.linalg.norm(actuales, axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        coseno = 1.0 - producto / normas
+    # Un embedding nulo no tiene dirección: se considera distancia máxima
+    coseno[normas == 0] = 1.0
+    euclidea = np.linalg.norm(anteriores - actuales, axis=1)
+    return coseno, euclidea
+
+def _guardar_puntuaciones(db_session, filas):
+    """Inserta o actualiza las puntuaciones por (ubicación, año) en una sola sentencia."""
+    stmt = pg_insert(CambioEmbedding).values(filas)
+    stmt = stmt.on_conflict_do_update(
+        constraint='uq_cambios_ubicacion_anio',
+        set_={
+            columna: stmt.excluded[columna]
+            for columna in ('latitud', 'longitud', 'anio_anterior', 'distancia_coseno',
+                            'distancia_euclidea', 'es_cambio', 'fecha_calculo')
+        }
+    )
+    db_session.execute(stmt)
+
+def detectar_cambios(db_session, umbral, metrica='coseno', tamano_lote=1000):
+    """
+    Calcula la distancia entre los embeddings de años consecutivos de cada ubicación
+    y marca como cambio las que superan el umbral. Es incremental: solo procesa las
+    ubicaciones con filas de AlphaEarth insertadas por transacciones terminadas desde la
+    última ejecución (requiere PostgreSQL 13 o superior).
+
+    Args:
+        db_session: Sesión de SQLAlchemy (db.session)
+        umbral: Distancia a partir de la cual se marca un cambio
+        metrica: 'coseno' o 'euclidea'
+        tamano_lote: Ubicaciones cargadas por consulta
+
+    Returns:
+        dict: Resumen con las ubicaciones, pares procesados y cambios detectados
+    """
+    if metrica not in METRICAS:
+        raise ValueError(f"Métrica desconocida: {metrica}. Disponibles: {', '.join(METRICAS)}")
+
+    # Los ids SERIAL no se confirman en orden (una transacción con ids menores puede
+    # terminar después), así que el avance se controla por transacción: todas las de
+    # xid menor que pg_snapshot_xmin ya han terminado y sus filas son visibles
+    desde = db_session.execute(
+        select(EjecucionCambios.horizonte_xid).order_by(EjecucionCambios.id_ejecucion.desc()).limit(1)
+    ).scalar() or 0
+    horizonte = db_session.execute(
+        select(cast(cast(func.pg_snapshot_xmin(func.pg_current_snapshot()), Text), BigInteger))
+    ).scalar()
+
+    lat_e5 = _clave(AlphaEarth.latitud)
+    lon_e5 = _clave(AlphaEarth.longitud)
+
+    # Ubicaciones y años con datos nuevos desde la última ejecución
+    nuevos = db_session.execute(
+        select(lat_e5, lon_e5, AlphaEarth.anio).where(
+            AlphaEarth.xid_insercion >= desde,
+            AlphaEarth.xid_insercion < horizonte
+        ).distinct()
+    ).all()
+    anios_nuevos = {}
+    for lat, lon, anio in nuevos:
+        anios_nuevos.setdefault((lat, lon), set()).add(anio)
+
+    ubicaciones = sorted(anios_nuevos)
+    pares_procesados = 0
+    cambios_detectados = 0
+
+    for inicio in range(0, len(ubicaciones), tamano_lote):
+        lote = ubicaciones[inicio:inicio + tamano_lote]
+        lats = [u[0] for u in lote]
+        lons = [u[1] for u in lote]
+
+        # Todos los años de las ubicaciones del lote en una consulta: el bbox del lote
+        # aprovecha el índice (latitud, longitud) y la tupla filtra las ubicaciones exactas
+        filas = db_session.execute(
+            select(lat_e5, lon_e5, AlphaEarth.anio, AlphaEarth.latitud, AlphaEarth.longitud,
+                   *[getattr(AlphaEarth, col) for col in COLUMNAS_EMBEDDING]).where(
+                AlphaEarth.latitud.between((min(lats) - 1) / FACTOR_CLAVE, (max(lats) + 1) / FACTOR_CLAVE),
+                AlphaEarth.longitud.between((min(lons) - 1) / FACTOR_CLAVE, (max(lons) + 1) / FACTOR_CLAVE),
+                AlphaEarth.xid_insercion < horizonte,
+                tuple_(lat_e5, lon_e5).in_(lote)
+            ).order_by(AlphaEarth.id_coordenadaaef)
+        ).all()
+
+        # Si hay varias filas de una ubicación y año se queda la más reciente
+        embeddings = {}
+        coordenadas = {}
+        for fila in filas:
+            embeddings[(fila[0], fila[1], fila[2])] = fila[5:]
+            coordenadas[(fila[0], fila[1])] = (fila[3], fila[4])
+
+        # Pares (año anterior, año) afectados por los años nuevos de cada ubicación
+        pares = set()
+        for ubicacion in lote:
+            for anio in anios_nuevos[ubicacion]:
+                for anterior, actual in ((anio - 1, anio), (anio, anio + 1)):
+                    if ubicacion + (anterior,) in embeddings and ubicacion + (actual,) in embeddings:
+                        pares.add((ubicacion, anterior, actual))
+        if not pares:
+            continue
+        pares = sorted(pares)
+
+        coseno, euclidea = distancias(
+            np.array([embeddings[u + (anterior,)] for u, anterior, _ in pares]),
+            np.array([embeddings[u + (actual,)] for u, _, actual in pares])
+        )
+        es_cambio = (coseno if metrica == 'coseno' else euclidea) > umbral
+
+        _guardar_puntuaciones(db_session, [{
+            "lat_e5": ubicacion[0],
+            "lon_e5": ubicacion[1],
+            "latitud": coordenadas[ubicacion][0],
+            "longitud": coordenadas[ubicacion][1],
+            "anio_anterior": anterior,
+            "anio": actual,
+            "distancia_coseno": float(coseno[i]),
+            "distancia_euclidea": float(euclidea[i]),
+            "es_cambio": bool(es_cambio[i]),
+            "fecha_calculo": func.now()
+        } for i, (ubicacion, anterior, actual) in enumerate(pares)])
+
+        pares_procesados += len(pares)
+        cambios_detectados += int(es_cambio.sum())
+
+    db_session.add(EjecucionCambios(
+        horizonte_xid=max(horizonte, desde),
+        umbral=umbral,
+        metrica=metrica,
+        pares_procesados=pares_procesados,
+        cambios_detectados=cambios_detectados
+    ))
+    db_session.commit()
+
+    return {
+        "ubicaciones": len(ubicaciones),
+        "pares_procesados": pares_procesados,
+        "cambios_detectados": cambios_detectados
+    }
+
+def listar_cambios(db_session, bbox=None, anio=None, solo_cambios=True, cursor=None, limit=5000):
+    """
+    Obtiene las puntuaciones de cambio guardadas, paginadas por cursor.
+
+    Args:
+        db_session: Sesión de SQLAlchemy (db.session)
+        bbox: Tupla (oeste, sur, este, norte) para filtrar (opcional)
+        anio: Año del cambio (opcional)
+        solo_cambios: Si es True devuelve solo las ubicaciones que superaron el umbral
+        cursor: Último id_cambio devuelto en la página anterior (opcional)
+        limit: Número máximo de filas
+
+    Returns:
+        tuple: (lista de filas, siguiente cursor o None)
+    """
+    stmt = select(CambioEmbedding)
+    if bbox is not None:
+        min_lon, min_lat, max_lon, max_lat = bbox
+        stmt = stmt.where(
+            CambioEmbedding.latitud.between(min_lat, max_lat),
+            CambioEmbedding.longitud.between(min_lon, max_lon)
+        )
+    if anio is not None:
+        stmt = stmt.where(CambioEmbedding.anio == anio)
+    if solo_cambios:
+        stmt = stmt.where(CambioEmbedding.es_cambio.is_(True))
+    if cursor is not None:
+        stmt = stmt.where(CambioEmbedding.id_cambio > cursor)
+    stmt = stmt.order_by(CambioEmbedding.id_cambio).limit(limit + 1)
+
+    filas = db_session.execute(stmt).scalars().all()
+    siguiente = None
+    if len(filas) > limit:
+        filas = filas[:limit]
+        siguiente = filas[-1].id_cambio
+    return filas, siguiente
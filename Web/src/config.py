@@ -1,41 +1,126 @@
 import os
 from dotenv import load_dotenv
+from pool_metrics import InstrumentedQueuePool
 
 # Cargar variables de entorno
 load_dotenv('conf/key.env')
 
+def _env_int(nombre, defecto):
+    """Lee una variable de entorno entera."""
+    valor = os.getenv(nombre)
+    return int(valor) if valor not in (None, '') else defecto
+
+def _env_bool(nombre, defecto):
+    """Lee una variable de entorno booleana (1/true/yes/si)."""
+    valor = os.getenv(nombre)
+    if valor in (None, ''):
+        return defecto
+    return valor.strip().lower() in ('1', 'true', 'yes', 'si', 'sí')
+
 class Config:
     """Configuración base."""
     SECRET_KEY = os.getenv('FLASK_SECRET_KEY') or 'dev-secret-key-change-in-production'
     
-    # Configuración de PostgreSQL
-    DB_HOST = "localhost"
-    DB_DATABASE = "tfg_remotesensing_aaa"
-    DB_USER = "postgres"
-    DB_PASSWORD = "tfgs2"
-    DB_PORT = 5432
+    # Configuración de PostgreSQL (sobrescribible con variables de entorno)
+    DB_HOST = os.getenv('DB_HOST', "localhost")
+    DB_DATABASE = os.getenv('DB_DATABASE', "tfg_remotesensing_aaa")
+    DB_USER = os.getenv('DB_USER', "postgres")
+    DB_PASSWORD = os.getenv('DB_PASSWORD', "tfgs2")
+    DB_PORT = _env_int('DB_PORT', 5432)
     
-    # Configuración de SQLAlchemy
-    SQLALCHEMY_DATABASE_URI = (
-        f"postgresql://{DB_USER}:{DB_PASSWORD}"
-        f"@{DB_HOST}:{DB_PORT}/{DB_DATABASE}"
-    )
+    # Configuración de SQLAlchemy (la URI y las opciones del engine se completan al final)
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_ECHO = False  # True para ver las queries SQL en consola
     
     # Pool de conexiones
-    SQLALCHEMY_ENGINE_OPTIONS = {
-        'pool_size': 10,           # Número de conexiones permanentes
-        'pool_recycle': 3600,      # Reciclar conexiones cada hora
-        'pool_pre_ping': True,     # Verificar conexión antes de usar
-        'max_overflow': 20         # Conexiones adicionales si se necesitan
-    }
+    DB_POOL_SIZE = _env_int('DB_POOL_SIZE', 10)                   # Número de conexiones permanentes
+    DB_MAX_OVERFLOW = _env_int('DB_MAX_OVERFLOW', 20)             # Conexiones adicionales si se necesitan
+    DB_POOL_TIMEOUT = _env_int('DB_POOL_TIMEOUT', 30)             # Segundos esperando una conexión libre
+    DB_POOL_RECYCLE = _env_int('DB_POOL_RECYCLE', 3600)           # Reciclar conexiones cada hora
+    DB_POOL_PRE_PING = _env_bool('DB_POOL_PRE_PING', True)        # Verificar conexión antes de usar
+    DB_STATEMENT_TIMEOUT_MS = _env_int('DB_STATEMENT_TIMEOUT_MS', 0)  # 0 = sin límite
+    DB_PGBOUNCER = _env_bool('DB_PGBOUNCER', False)               # Conexión a través de PgBouncer
+
+    # Mapa: límites de la API /api/points/bbox
+    MAPA_MAX_PUNTOS = 5000         # Máximo de puntos por página
+    MAPA_MAX_CLUSTERS = 2000       # Máximo de clusters por respuesta
+    MAPA_ZOOM_CLUSTER = 14         # Por debajo de este zoom se agrupan los puntos
+    MAPA_CELDAS_POR_TESELA = 8     # Celdas de la malla por tesela de 256 px
+
+    # Precarga de regiones (prefetch)
+    PREFETCH_MAX_PUNTOS = 50000    # Máximo de puntos de la malla por región
+    PREFETCH_MAX_PUNTOS_HTTP = 5000  # Máximo por petición a /api/prefetch (más grandes: flask prefetch)
+    PREFETCH_TAMANO_LOTE = 5000    # Puntos por llamada a Earth Engine (límite de getInfo)
+    PREFETCH_ESPACIADO_MAX = 10.0  # Espaciado máximo de la malla (m); la caché busca a medio paso
+
+    # Particionado por año de AlphaEarth y Sentinel2
+    PARTICIONES_ANIO_INICIO = 2017 # Primer año con particiones creadas al arrancar
+
+    # Detección de cambios entre años de AlphaEarth
+    CAMBIOS_METRICA = 'coseno'     # 'coseno' o 'euclidea'
+    CAMBIOS_UMBRAL = 0.2           # Distancia a partir de la cual se marca un cambio
+
+    # Caché del user_loader de Flask-Login
+    USER_CACHE_TTL = 300           # Segundos que un usuario permanece en caché
+    USER_CACHE_MAXSIZE = 1024      # Número máximo de usuarios en caché
+
+    # Login: verificación de contraseñas y límite de intentos
+    LOGIN_MAX_HASHES = 2           # Contraseñas verificadas en paralelo (scrypt es costoso)
+    LOGIN_ESPERA_HASH = 0.005      # Segundos máximos esperando plaza antes de responder 429
+    LOGIN_MAX_INTENTOS = 5         # Intentos fallidos permitidos por usuario e IP
+    LOGIN_MAX_INTENTOS_ORIGEN = 20 # Intentos fallidos permitidos por IP (con cualquier usuario)
+    LOGIN_VENTANA = 300            # Segundos durante los que se cuentan los intentos fallidos
+    LOGIN_MAX_CLAVES = 10000       # Pares (usuario, IP) controlados a la vez
 
 class DevelopmentConfig(Config):
     """Configuración para desarrollo."""
     DEBUG = True
     SQLALCHEMY_ECHO = False  # Mostrar queries SQL en desarrollo
 
+class ProductionConfig(Config):
+    """Configuración para producción."""
+    DEBUG = False
+    # Sin pre_ping (un round trip por checkout); las conexiones caídas se evitan reciclándolas antes
+    DB_POOL_PRE_PING = _env_bool('DB_POOL_PRE_PING', False)
+    DB_POOL_RECYCLE = _env_int('DB_POOL_RECYCLE', 1800)
+    DB_STATEMENT_TIMEOUT_MS = _env_int('DB_STATEMENT_TIMEOUT_MS', 30000)
+
+class TestingConfig(Config):
+    """Configuración para pruebas."""
+    TESTING = True
+    WTF_CSRF_ENABLED = False
+    DB_DATABASE = os.getenv('DB_DATABASE_TEST', "tfg_remotesensing_aaa_test")
+    DB_POOL_SIZE = _env_int('DB_POOL_SIZE', 2)
+    DB_MAX_OVERFLOW = _env_int('DB_MAX_OVERFLOW', 0)
+    DB_STATEMENT_TIMEOUT_MS = _env_int('DB_STATEMENT_TIMEOUT_MS', 10000)
+
+def opciones_engine(cls):
+    """Construye SQLALCHEMY_ENGINE_OPTIONS a partir de los parámetros DB_* de una configuración."""
+    opciones = {
+        'poolclass': InstrumentedQueuePool,   # Mide la espera del pool (ver /api/metrics/pool)
+        'pool_size': cls.DB_POOL_SIZE,
+        'max_overflow': cls.DB_MAX_OVERFLOW,
+        'pool_timeout': cls.DB_POOL_TIMEOUT,
+        'pool_recycle': cls.DB_POOL_RECYCLE,
+        'pool_pre_ping': cls.DB_POOL_PRE_PING and not cls.DB_PGBOUNCER
+    }
+    # PgBouncer rechaza el parámetro de arranque 'options': en ese caso el timeout
+    # se aplica por transacción (pool_metrics.configurar_engine)
+    if cls.DB_STATEMENT_TIMEOUT_MS and not cls.DB_PGBOUNCER:
+        opciones['connect_args'] = {'options': f"-c statement_timeout={cls.DB_STATEMENT_TIMEOUT_MS}"}
+    return opciones
+
+for _cls in (Config, DevelopmentConfig, ProductionConfig, TestingConfig):
+    # Las pruebas nunca usan DATABASE_URL, para no apuntar por error a la BD real
+    _variable_url = 'DATABASE_URL_TEST' if _cls is TestingConfig else 'DATABASE_URL'
+    _cls.SQLALCHEMY_DATABASE_URI = os.getenv(_variable_url) or (
+        f"postgresql://{_cls.DB_USER}:{_cls.DB_PASSWORD}"
+        f"@{_cls.DB_HOST}:{_cls.DB_PORT}/{_cls.DB_DATABASE}"
+    )
+    _cls.SQLALCHEMY_ENGINE_OPTIONS = opciones_engine(_cls)
+
 config = {
-    'development': DevelopmentConfig
+    'development': DevelopmentConfig,
+    'production': ProductionConfig,
+    'testing': TestingConfig
 }
\ No newline at end of file
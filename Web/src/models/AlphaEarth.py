@@ -2,11 +2,20 @@ from extensions import db
 
 class AlphaEarth(db.Model):
     __tablename__ = 'alphaearth'
+    __table_args__ = (
+        # Índice para las consultas por bounding box del mapa
+        db.Index('idx_alphaearth_lat_lon', 'latitud', 'longitud'),
+        # Filas nuevas para la detección incremental de cambios
+        db.Index('idx_alphaearth_xid_insercion', 'xid_insercion'),
+        # Una partición por año (ver partitions.py)
+        {'postgresql_partition_by': 'RANGE (anio)'},
+    )
 
-    id_coordenadaaef = db.Column(db.Integer, primary_key=True)
+    # La clave de partición (anio) tiene que formar parte de la clave primaria
+    id_coordenadaaef = db.Column(db.Integer, primary_key=True, autoincrement=True)
     latitud = db.Column(db.Float, nullable=False)
     longitud = db.Column(db.Float, nullable=False)
-    anio = db.Column(db.Integer, nullable=False)
+    anio = db.Column(db.Integer, primary_key=True, nullable=False)
     es_residuo = db.Column(db.Boolean, nullable=False)
     tipo_residuo = db.Column(db.String(50), nullable=True)
     a00 = db.Column(db.Float, nullable=False)
@@ -73,6 +82,10 @@ class AlphaEarth(db.Model):
     a61 = db.Column(db.Float, nullable=False)
     a62 = db.Column(db.Float, nullable=False)
     a63 = db.Column(db.Float, nullable=False)
+    # Transacción que insertó la fila (xid8 de PostgreSQL, sin vuelta): la detección de
+    # cambios procesa solo filas de transacciones ya terminadas (ver change_detection.py)
+    xid_insercion = db.Column(db.BigInteger, nullable=False,
+                              server_default=db.text("pg_current_xact_id()::text::bigint"))
 
     def __init__(self, latitud, longitud, anio, es_residuo, tipo_residuo=None, **kwargs):
         self.latitud = latitud
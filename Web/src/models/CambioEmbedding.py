@@ -0,0 +1,27 @@
+from datetime import datetime
+from extensions import db
+
+class CambioEmbedding(db.Model):
+    __tablename__ = 'cambios_embedding'
+    __table_args__ = (
+        # Una puntuación por ubicación y año; permite recalcular con upsert
+        db.UniqueConstraint('lat_e5', 'lon_e5', 'anio', name='uq_cambios_ubicacion_anio'),
+        db.Index('idx_cambios_anio_coseno', 'anio', 'distancia_coseno'),
+        db.Index('idx_cambios_lat_lon', 'latitud', 'longitud'),
+    )
+
+    id_cambio = db.Column(db.Integer, primary_key=True)
+    # Coordenadas redondeadas a 5 decimales (~1 m) que identifican la ubicación entre años
+    lat_e5 = db.Column(db.Integer, nullable=False)
+    lon_e5 = db.Column(db.Integer, nullable=False)
+    latitud = db.Column(db.Float, nullable=False)
+    longitud = db.Column(db.Float, nullable=False)
+    anio_anterior = db.Column(db.Integer, nullable=False)
+    anio = db.Column(db.Integer, nullable=False)
+    distancia_coseno = db.Column(db.Float, nullable=False)
+    distancia_euclidea = db.Column(db.Float, nullable=False)
+    es_cambio = db.Column(db.Boolean, nullable=False)
+    fecha_calculo = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<CambioEmbedding lat={self.latitud}, lon={self.longitud}, {self.anio_anterior}->{self.anio}, coseno={self.distancia_coseno}>"
@@ -0,0 +1,18 @@
+from datetime import datetime
+from extensions import db
+
+class EjecucionCambios(db.Model):
+    __tablename__ = 'ejecuciones_cambios'
+
+    id_ejecucion = db.Column(db.Integer, primary_key=True)
+    # Las filas de AlphaEarth insertadas por transacciones con xid menor ya están procesadas:
+    # la siguiente ejecución parte de aquí
+    horizonte_xid = db.Column(db.BigInteger, nullable=False)
+    umbral = db.Column(db.Float, nullable=False)
+    metrica = db.Column(db.String(15), nullable=False)
+    pares_procesados = db.Column(db.Integer, nullable=False)
+    cambios_detectados = db.Column(db.Integer, nullable=False)
+    fecha = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<EjecucionCambios id={self.id_ejecucion}, horizonte_xid={self.horizonte_xid}, fecha={self.fecha}>"
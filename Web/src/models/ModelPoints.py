@@ -0,0 +1,107 @@
+from sqlalchemy import select, func, case
+from .AlphaEarth import AlphaEarth
+
+class ModelPoints:
+
+    @classmethod
+    def get_in_bbox(cls, db_session, min_lon, min_lat, max_lon, max_lat, anio=None, cursor=None, limit=1000,
+                    incluir_embeddings=False):
+        """
+        Obtiene los puntos etiquetados dentro de un bounding box usando paginación por cursor.
+
+        Args:
+            db_session: Sesión de SQLAlchemy (db.session)
+            min_lon, min_lat, max_lon, max_lat: Límites del bounding box (WGS84)
+            anio: Año a filtrar (opcional)
+            cursor: Último id devuelto en la página anterior (opcional)
+            limit: Número máximo de puntos a devolver
+            incluir_embeddings: Si es True, añade las columnas a00..a63 a cada fila
+
+        Returns:
+            tuple: (lista de filas, siguiente cursor o None si no hay más páginas)
+        """
+        try:
+            columnas = [
+                AlphaEarth.id_coordenadaaef,
+                AlphaEarth.latitud,
+                AlphaEarth.longitud,
+                AlphaEarth.anio,
+                AlphaEarth.es_residuo,
+                AlphaEarth.tipo_residuo
+            ]
+            if incluir_embeddings:
+                columnas += [getattr(AlphaEarth, f"a{i:02d}") for i in range(64)]
+
+            stmt = select(*columnas).where(*cls._filtros_bbox(min_lon, min_lat, max_lon, max_lat, anio))
+
+            # Paginación por keyset: evita el coste de OFFSET en tablas grandes
+            if cursor is not None:
+                stmt = stmt.where(AlphaEarth.id_coordenadaaef > cursor)
+
+            # Pedir una fila extra para saber si existe una página siguiente
+            stmt = stmt.order_by(AlphaEarth.id_coordenadaaef).limit(limit + 1)
+            filas = db_session.execute(stmt).all()
+
+            siguiente = None
+            if len(filas) > limit:
+                filas = filas[:limit]
+                siguiente = filas[-1].id_coordenadaaef
+
+            return filas, siguiente
+
+        except Exception as e:
+            print(f"❌ Error en get_in_bbox: {e}")
+            raise Exception(f"Error fetching points in bbox: {e}")
+
+    @classmethod
+    def get_clusters_in_bbox(cls, db_session, min_lon, min_lat, max_lon, max_lat, tamano_celda, anio=None, limit=2000):
+        """
+        Agrupa en el servidor los puntos del bounding box en una malla regular.
+
+        Args:
+            db_session: Sesión de SQLAlchemy (db.session)
+            min_lon, min_lat, max_lon, max_lat: Límites del bounding box (WGS84)
+            tamano_celda: Tamaño de la celda de la malla en grados
+            anio: Año a filtrar (opcional)
+            limit: Número máximo de clusters a devolver
+
+        Returns:
+            list: Filas con la celda, el número de puntos, los residuos y el centroide
+        """
+        try:
+            celda_x = func.floor(AlphaEarth.longitud / tamano_celda).label('celda_x')
+            celda_y = func.floor(AlphaEarth.latitud / tamano_celda).label('celda_y')
+
+            stmt = select(
+                celda_x,
+                celda_y,
+                func.count().label('total'),
+                func.sum(case((AlphaEarth.es_residuo, 1), else_=0)).label('residuos'),
+                func.avg(AlphaEarth.latitud).label('latitud'),
+                func.avg(AlphaEarth.longitud).label('longitud')
+            ).where(
+                *cls._filtros_bbox(min_lon, min_lat, max_lon, max_lat, anio)
+            ).group_by(
+                celda_x, celda_y
+            ).order_by(
+                func.count().desc()
+            ).limit(limit)
+
+            return db_session.execute(stmt).all()
+
+        except Exception as e:
+            print(f"❌ Error en get_clusters_in_bbox: {e}")
+            raise Exception(f"Error fetching clusters in bbox: {e}")
+
+    @staticmethod
+    def _filtros_bbox(min_lon, min_lat, max_lon, max_lat, anio=None):
+        """Condiciones del bounding box, compatibles con el índice (latitud, longitud)."""
+        filtros = [
+            AlphaEarth.latitud.between(min_lat, max_lat),
+            AlphaEarth.longitud.between(min_lon, max_lon),
+            # Los puntos precargados sin etiqueta no se muestran en el mapa
+            AlphaEarth.tipo_residuo.isnot(None)
+        ]
+        if anio is not None:
+            filtros.append(AlphaEarth.anio == anio)
+        return filtros
@@ -1,66 +1,161 @@
+import threading
+from cachetools import TTLCache
+from flask import current_app
 from sqlalchemy import select
 from .entities.User import User
 from sqlalchemy.orm import Session
 
+class LoginThrottled(Exception):
+    """Se lanza cuando un login se rechaza por exceso de intentos o de carga."""
+
 class ModelUser:
-    
+
+    # Caché de usuarios para el user_loader de Flask-Login: id -> username
+    _cache_usuarios = None
+    # Intentos fallidos por (username, origen) y por origen dentro de la ventana de tiempo
+    _intentos_fallidos = None
+    _intentos_por_origen = None
+    # Verificaciones de contraseña simultáneas (scrypt es costoso)
+    _plazas_hash = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def _inicializar(cls):
+        """Crea las cachés y el pool de verificación con la configuración de la app."""
+        if cls._plazas_hash is not None:
+            return
+        with cls._lock:
+            if cls._plazas_hash is not None:
+                return
+            config = current_app.config
+            cls._cache_usuarios = TTLCache(maxsize=config['USER_CACHE_MAXSIZE'], ttl=config['USER_CACHE_TTL'])
+            cls._intentos_fallidos = TTLCache(maxsize=config['LOGIN_MAX_CLAVES'], ttl=config['LOGIN_VENTANA'])
+            cls._intentos_por_origen = TTLCache(maxsize=config['LOGIN_MAX_CLAVES'], ttl=config['LOGIN_VENTANA'])
+            cls._plazas_hash = threading.BoundedSemaphore(config['LOGIN_MAX_HASHES'])
+
     @classmethod
-    def login(cls, db_session, user):
+    def login(cls, db_session, user, origen=None):
         """
         Inicia sesión de un usuario usando SQLAlchemy.
-        
+
         Args:
             db_session: Sesión de SQLAlchemy (db.session)
             user: Objeto User con username y password
-        
+            origen: Dirección IP del cliente, para limitar los intentos fallidos (opcional)
+
         Returns:
             User: Objeto User si el login es exitoso, None si falla
+
+        Raises:
+            LoginThrottled: Si hay demasiados intentos fallidos o demasiados logins en curso
         """
+        cls._inicializar()
+        clave = (user.username, origen)
+
+        # Rechazar sin consultar la BD ni calcular el hash si se superó el límite de intentos,
+        # por usuario y origen o solo por origen (una IP que prueba usuarios distintos)
+        with cls._lock:
+            intentos = cls._intentos_fallidos.get(clave, 0)
+            intentos_origen = cls._intentos_por_origen.get(origen, 0)
+        if intentos >= current_app.config['LOGIN_MAX_INTENTOS']:
+            print(f"⚠️ Login bloqueado temporalmente para {user.username} desde {origen}")
+            raise LoginThrottled("Demasiados intentos fallidos")
+        if intentos_origen >= current_app.config['LOGIN_MAX_INTENTOS_ORIGEN']:
+            print(f"⚠️ Login bloqueado temporalmente desde {origen}")
+            raise LoginThrottled("Demasiados intentos fallidos desde este origen")
+
         try:
             # Buscar usuario por username usando SQLAlchemy ORM
             stmt = select(User).filter_by(username=user.username)
-            db_user = db_session.execute(stmt).scalar_one_or_none()  
-            
+            db_user = db_session.execute(stmt).scalar_one_or_none()
+
             if db_user is not None:
                 # Verificar contraseña
-                if User.check_password(db_user.password_hash, user.password_hash):
+                if cls._verificar_password(db_user.password_hash, user.password_hash):
+                    with cls._lock:
+                        cls._intentos_fallidos.pop(clave, None)
                     # Devolver usuario con contraseña válida
                     return User(db_user.id, db_user.username, db_user.password_hash)
                 else:
+                    cls._registrar_fallo(clave)
                     # Devolver usuario sin contraseña (indica contraseña incorrecta)
                     return User(db_user.id, db_user.username, None)
             else:
+                cls._registrar_fallo(clave)
                 print("Login failed: Invalid username")
                 return None
-                
+
+        except LoginThrottled:
+            raise
         except Exception as e:
             print(f"❌ Error en login: {e}")
-            raise Exception(f"Error fetching user: {e}") 
-        
-    @classmethod    
+            raise Exception(f"Error fetching user: {e}")
+
+    @classmethod
+    def _verificar_password(cls, hashed_password, password):
+        """
+        Verifica la contraseña si hay una plaza libre. Si ya hay LOGIN_MAX_HASHES
+        verificaciones en curso se rechaza el login enseguida (429) en lugar de dejar
+        el hilo de la API esperando turno.
+        """
+        if not cls._plazas_hash.acquire(timeout=current_app.config['LOGIN_ESPERA_HASH']):
+            print("⚠️ Verificación de contraseñas saturada")
+            raise LoginThrottled("Demasiados logins en curso")
+        try:
+            return User.check_password(hashed_password, password)
+        finally:
+            cls._plazas_hash.release()
+
+    @classmethod
+    def _registrar_fallo(cls, clave):
+        """Suma un intento fallido para la clave (username, origen) y para el origen."""
+        origen = clave[1]
+        with cls._lock:
+            cls._intentos_fallidos[clave] = cls._intentos_fallidos.get(clave, 0) + 1
+            cls._intentos_por_origen[origen] = cls._intentos_por_origen.get(origen, 0) + 1
+
+    @classmethod
     def get_by_id(cls, db_session, id):
         """
         Obtiene un usuario por su ID usando SQLAlchemy.
-        
+        Usa una caché con TTL para no consultar la BD en cada petición autenticada.
+
         Args:
             db_session: Sesión de SQLAlchemy (db.session)
             id: ID del usuario
-        
+
         Returns:
             User: Objeto User si se encuentra, None si no existe
         """
+        cls._inicializar()
+        with cls._lock:
+            username = cls._cache_usuarios.get(str(id))
+        if username is not None:
+            # Devolver usuario sin contraseña (por seguridad)
+            return User(int(id), username, None)
+
         try:
             # Buscar usuario por ID usando SQLAlchemy ORM
             stmt = select(User).filter_by(id=id)
             db_user = db_session.execute(stmt).scalar_one_or_none()
-            
+
             if db_user is not None:
+                with cls._lock:
+                    cls._cache_usuarios[str(id)] = db_user.username
                 # Devolver usuario sin contraseña (por seguridad)
                 return User(db_user.id, db_user.username, None)
             else:
                 print(f"⚠️ User with ID {id} not found")
                 return None
-                
+
         except Exception as e:
             print(f"❌ Error en get_by_id: {e}")
-            raise Exception(f"Error fetching user by ID: {e}")
\ No newline at end of file
+            raise Exception(f"Error fetching user by ID: {e}")
+
+    @classmethod
+    def invalidate(cls, id):
+        """Elimina un usuario de la caché (al cerrar sesión o si cambian sus datos)."""
+        if cls._cache_usuarios is None:
+            return
+        with cls._lock:
+            cls._cache_usuarios.pop(str(id), None)
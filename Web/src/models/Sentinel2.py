@@ -2,11 +2,18 @@ from extensions import db
     
 class Sentinel2(db.Model):
     __tablename__ = 'sentinel2'
+    __table_args__ = (
+        # Índice para las consultas por bounding box
+        db.Index('idx_sentinel2_lat_lon', 'latitud', 'longitud'),
+        # Una partición por año de la imagen (ver partitions.py)
+        {'postgresql_partition_by': 'RANGE (fecha)'},
+    )
     
-    id_sentinel2 = db.Column(db.Integer, primary_key=True)
+    # La clave de partición (fecha) tiene que formar parte de la clave primaria
+    id_sentinel2 = db.Column(db.Integer, primary_key=True, autoincrement=True)
     latitud = db.Column(db.Float, nullable=False)
     longitud = db.Column(db.Float, nullable=False)
-    fecha = db.Column(db.Date, nullable=False)
+    fecha = db.Column(db.Date, primary_key=True, nullable=False)
     es_residuo = db.Column(db.Boolean, nullable=False)
     tipo_residuo = db.Column(db.String(50), nullable=True)
     b1 = db.Column(db.Float, nullable=False)
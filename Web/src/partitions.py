@@ -0,0 +1,101 @@
+"""
+Particionado declarativo de PostgreSQL por año para las tablas AlphaEarth y Sentinel2.
+"""
+import threading
+from datetime import date
+from sqlalchemy import text
+
+# Tabla padre -> función que devuelve los límites (desde, hasta) de la partición de un año
+TABLAS_PARTICIONADAS = {
+    'alphaearth': lambda anio: (f"{anio}", f"{anio + 1}"),
+    'sentinel2': lambda anio: (f"'{anio}-01-01'", f"'{anio + 1}-01-01'"),
+}
+
+# Particiones ya comprobadas en este proceso, para no lanzar DDL en cada inserción
+_particiones_creadas = set()
+_tablas_particionadas = {}
+_lock = threading.Lock()
+
+def nombre_particion(tabla, anio):
+    """Devuelve el nombre de la partición de un año."""
+    return f"{tabla}_{anio}"
+
+def _es_particionada(conexion, tabla):
+    """Comprueba si la tabla está particionada (las BBDD antiguas pueden no estarlo)."""
+    if tabla not in _tablas_particionadas:
+        if conexion.dialect.name != 'postgresql':
+            _tablas_particionadas[tabla] = False
+        else:
+            resultado = conexion.execute(
+                text("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:tabla)"),
+                {"tabla": tabla}
+            ).first()
+            _tablas_particionadas[tabla] = resultado is not None
+    return _tablas_particionadas[tabla]
+
+def asegurar_particiones(engine, anio):
+    """
+    Crea, si no existen, las particiones de un año en todas las tablas particionadas.
+    Se llama antes de insertar; tras la primera vez no accede a la base de datos.
+
+    La sesión que va a insertar no debe tener una transacción abierta: el DDL se lanza
+    desde otra conexión del pool y CREATE TABLE ... PARTITION OF espera a los locks que
+    esa transacción tenga sobre la tabla padre (aunque solo haya hecho SELECT), con lo
+    que el hilo se bloquearía a sí mismo sin que PostgreSQL lo detecte como deadlock.
+
+    Args:
+        engine: Engine de SQLAlchemy (db.engine)
+        anio: Año de los datos que se van a insertar
+    """
+    anio = int(anio)
+    pendientes = [tabla for tabla in TABLAS_PARTICIONADAS if (tabla, anio) not in _particiones_creadas]
+    if not pendientes:
+        return
+
+    with _lock:
+        # DDL en su propia transacción para no mezclarlo con la sesión de la petición
+        with engine.begin() as conexion:
+            for tabla in pendientes:
+                if _es_particionada(conexion, tabla):
+                    desde, hasta = TABLAS_PARTICIONADAS[tabla](anio)
+                    conexion.execute(text(
+                        f"CREATE TABLE IF NOT EXISTS {nombre_particion(tabla, anio)} "
+                        f"PARTITION OF {tabla} FOR VALUES FROM ({desde}) TO ({hasta})"
+                    ))
+                _particiones_creadas.add((tabla, anio))
+
+def archivar_particion(engine, tabla, anio):
+    """
+    Separa la partición de un año de su tabla padre. La partición queda como tabla
+    independiente que se puede exportar (pg_dump) y eliminar sin afectar al resto.
+    Se renombra a <tabla>_<año>_archivada: con el nombre original, el siguiente
+    CREATE TABLE IF NOT EXISTS de ese año no haría nada y las inserciones fallarían.
+
+    Args:
+        engine: Engine de SQLAlchemy (db.engine)
+        tabla: 'alphaearth' o 'sentinel2'
+        anio: Año a archivar
+
+    Returns:
+        str: Nombre de la tabla archivada
+    """
+    if tabla not in TABLAS_PARTICIONADAS:
+        raise ValueError(f"Tabla no particionada: {tabla}")
+    particion = nombre_particion(tabla, int(anio))
+    archivada = f"{particion}_archivada"
+    with _lock:
+        with engine.begin() as conexion:
+            conexion.execute(text(f"ALTER TABLE {tabla} DETACH PARTITION {particion}"))
+            conexion.execute(text(f"ALTER TABLE {particion} RENAME TO {archivada}"))
+        _particiones_creadas.discard((tabla, int(anio)))
+    return archivada
+
+def init_particiones(app, db):
+    """Crea las particiones desde PARTICIONES_ANIO_INICIO hasta el año siguiente al actual."""
+    try:
+        with app.app_context():
+            for anio in range(app.config['PARTICIONES_ANIO_INICIO'], date.today().year + 2):
+                asegurar_particiones(db.engine, anio)
+        print("Particiones de la base de datos comprobadas correctamente.")
+    except Exception as e:
+        print(f"Error al crear las particiones: {e}")
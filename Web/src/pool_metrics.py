@@ -0,0 +1,158 @@
+"""
+Instrumentación del pool de conexiones de SQLAlchemy: tiempo de espera en el checkout,
+conexiones en uso y overflow, y una prueba de carga para comparar tamaños de pool.
+"""
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+# Esperas recientes que se guardan para calcular percentiles
+MUESTRAS_ESPERA = 5000
+
+class EstadisticasPool:
+    """Contadores del pool, seguros entre hilos."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.esperas = deque(maxlen=MUESTRAS_ESPERA)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.max_en_uso = 0
+
+    def registrar_espera(self, segundos):
+        with self._lock:
+            self.esperas.append(segundos)
+            self.checkouts += 1
+
+    def registrar_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def registrar_en_uso(self, en_uso):
+        with self._lock:
+            self.max_en_uso = max(self.max_en_uso, en_uso)
+
+    def resumen(self):
+        with self._lock:
+            esperas = np.array(self.esperas, dtype=np.float64) * 1000
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "max_en_uso": self.max_en_uso,
+                "espera_media_ms": round(float(esperas.mean()), 3) if esperas.size else 0.0,
+                "espera_p50_ms": round(float(np.percentile(esperas, 50)), 3) if esperas.size else 0.0,
+                "espera_p99_ms": round(float(np.percentile(esperas, 99)), 3) if esperas.size else 0.0,
+                "espera_max_ms": round(float(esperas.max()), 3) if esperas.size else 0.0
+            }
+
+class InstrumentedQueuePool(QueuePool):
+    """
+    QueuePool que mide cuánto espera cada petición para obtener una conexión.
+
+    Se sobrescribe el método privado _do_get porque los eventos del pool no permiten
+    medir la espera: 'checkout' se emite cuando la conexión ya se ha obtenido, no hay
+    ningún evento antes de empezar a esperar, y un TimeoutError del pool no emite
+    ninguno. Comprobado con SQLAlchemy 2.0.44 (requirements.txt) y 2.1; al actualizar
+    SQLAlchemy hay que revisar que QueuePool._do_get siga existiendo con esta firma.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.estadisticas = EstadisticasPool()
+
+    def _do_get(self):
+        inicio = time.perf_counter()
+        try:
+            conexion = super()._do_get()
+        except PoolTimeoutError:
+            self.estadisticas.registrar_timeout()
+            raise
+        self.estadisticas.registrar_espera(time.perf_counter() - inicio)
+        self.estadisticas.registrar_en_uso(self.checkedout())
+        return conexion
+
+def metricas_pool(engine):
+    """
+    Devuelve el estado actual del pool del engine y las estadísticas acumuladas.
+
+    Returns:
+        dict: Tamaño, conexiones en uso, libres y de overflow, y tiempos de espera
+    """
+    pool = engine.pool
+    metricas = {"pool": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        metricas.update({
+            "tamano": pool.size(),
+            "en_uso": pool.checkedout(),
+            "libres": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0),
+            "max_overflow": pool._max_overflow
+        })
+    if isinstance(pool, InstrumentedQueuePool):
+        metricas.update(pool.estadisticas.resumen())
+    return metricas
+
+def configurar_engine(engine, config):
+    """
+    Registra los eventos del engine que dependen de la configuración.
+    Con PgBouncer en modo transacción no se puede pasar statement_timeout como
+    parámetro de arranque ni fijarlo por sesión: se aplica con SET LOCAL en cada transacción.
+    """
+    timeout = config.get('DB_STATEMENT_TIMEOUT_MS')
+    if timeout and config.get('DB_PGBOUNCER') and engine.dialect.name == 'postgresql':
+        @event.listens_for(engine, 'begin')
+        def fijar_statement_timeout(conexion):
+            conexion.exec_driver_sql(f"SET LOCAL statement_timeout = {int(timeout)}")
+
+def prueba_carga_pool(uri, tamanos, hilos=20, peticiones=500, duracion_consulta=0.02, opciones=None):
+    """
+    Lanza la misma carga concurrente contra engines con distintos tamaños de pool
+    y mide la latencia de cada petición (espera del pool + consulta).
+
+    Args:
+        uri: URI de la base de datos
+        tamanos: Tamaños de pool a comparar
+        hilos: Peticiones concurrentes
+        peticiones: Peticiones por tamaño de pool
+        duracion_consulta: Segundos de cada consulta (pg_sleep)
+        opciones: Opciones adicionales de create_engine
+
+    Returns:
+        list: Un diccionario de resultados por tamaño de pool
+    """
+    resultados = []
+    for tamano in tamanos:
+        engine = create_engine(uri, **{
+            **(opciones or {}),
+            'poolclass': InstrumentedQueuePool,
+            'pool_size': tamano,
+            'max_overflow': 0
+        })
+
+        def peticion(_):
+            inicio = time.perf_counter()
+            with engine.connect() as conexion:
+                conexion.execute(text("SELECT pg_sleep(:segundos)"), {"segundos": duracion_consulta})
+            return time.perf_counter() - inicio
+
+        try:
+            inicio = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=hilos) as executor:
+                latencias = np.array(list(executor.map(peticion, range(peticiones)))) * 1000
+            total = time.perf_counter() - inicio
+
+            resultados.append({
+                "pool_size": tamano,
+                "peticiones_por_segundo": round(peticiones / total, 1),
+                "latencia_p50_ms": round(float(np.percentile(latencias, 50)), 1),
+                "latencia_p99_ms": round(float(np.percentile(latencias, 99)), 1),
+                **engine.pool.estadisticas.resumen()
+            })
+        finally:
+            engine.dispose()
+    return resultados
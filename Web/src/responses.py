@@ -0,0 +1,193 @@
+"""
+Negociación de contenido para las APIs de puntos: JSON, MessagePack o Arrow IPC,
+con compresión gzip/brotli y envío por partes de los resultados grandes.
+"""
+import json
+import zlib
+import numpy as np
+from flask import Response, jsonify
+
+# Dependencias opcionales: si no están instaladas el formato no se ofrece
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+FORMATOS = {
+    'json': 'application/json',
+    'msgpack': 'application/msgpack',
+    'arrow': 'application/vnd.apache.arrow.stream'
+}
+
+# Tamaño mínimo (bytes) a partir del cual se comprime la respuesta
+MIN_BYTES_COMPRESION = 1024
+
+# Filas por record batch de Arrow al enviar la respuesta por partes
+FILAS_POR_LOTE = 10000
+
+def formatos_disponibles():
+    """Devuelve los formatos cuya dependencia está instalada."""
+    disponibles = ['json']
+    if msgpack is not None:
+        disponibles.append('msgpack')
+    if pa is not None:
+        disponibles.append('arrow')
+    return disponibles
+
+def elegir_formato(request):
+    """
+    Elige el formato de la respuesta a partir del parámetro 'format' o de la cabecera Accept.
+
+    Returns:
+        str: 'json', 'msgpack' o 'arrow'; None si el formato pedido no está disponible
+    """
+    disponibles = formatos_disponibles()
+    formato = request.args.get('format', default=None, type=str)
+    if formato:
+        formato = formato.lower()
+        return formato if formato in disponibles else None
+
+    mimetype = request.accept_mimetypes.best_match(
+        [FORMATOS[f] for f in disponibles], default=FORMATOS['json']
+    )
+    return next(f for f in disponibles if FORMATOS[f] == mimetype)
+
+def elegir_compresion(request):
+    """Elige la codificación según Accept-Encoding: brotli si está disponible, si no gzip."""
+    if brotli is not None and request.accept_encodings['br']:
+        return 'br'
+    if request.accept_encodings['gzip']:
+        return 'gzip'
+    return None
+
+def _compresor(codificacion):
+    """Devuelve las funciones (comprimir, terminar) de un compresor incremental."""
+    if codificacion == 'br':
+        compresor = brotli.Compressor(quality=5)
+        return compresor.process, compresor.finish
+    # wbits=31: formato gzip con cabecera y CRC
+    compresor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    return compresor.compress, compresor.flush
+
+def _comprimir_partes(partes, codificacion):
+    """Comprime un iterable de bloques de bytes sin cargarlos todos en memoria."""
+    comprimir, terminar = _compresor(codificacion)
+    for parte in partes:
+        bloque = comprimir(parte)
+        if bloque:
+            yield bloque
+    yield terminar()
+
+def _codificar_msgpack(valor):
+    """Convierte los arrays de NumPy a un mapa compacto con dtype, shape y bytes crudos."""
+    if isinstance(valor, np.ndarray):
+        if valor.dtype == object:
+            return valor.tolist()
+        return {
+            'dtype': valor.dtype.str,
+            'shape': list(valor.shape),
+            'data': np.ascontiguousarray(valor).tobytes()
+        }
+    if isinstance(valor, np.generic):
+        return valor.item()
+    raise TypeError(f"Tipo no serializable: {type(valor).__name__}")
+
+def _columna_arrow(valores):
+    """Convierte una columna a un array de Arrow; las matrices 2D van como listas de tamaño fijo."""
+    if isinstance(valores, np.ndarray) and valores.ndim == 2:
+        planos = pa.array(np.ascontiguousarray(valores).ravel())
+        return pa.FixedSizeListArray.from_arrays(planos, valores.shape[1])
+    return pa.array(valores)
+
+def _tabla_arrow(tabla, metadatos):
+    """Construye una tabla de Arrow con los metadatos como metadatos del esquema."""
+    columnas = {nombre: _columna_arrow(valores) for nombre, valores in tabla.items()}
+    tabla_arrow = pa.table(columnas)
+    return tabla_arrow.replace_schema_metadata(
+        {clave: json.dumps(valor, default=str) for clave, valor in metadatos.items()}
+    )
+
+class _BufferPartes:
+    """Fichero en memoria que se vacía en cada parte enviada al cliente."""
+
+    def __init__(self):
+        self.bloques = []
+        self.closed = False
+
+    def write(self, datos):
+        self.bloques.append(bytes(datos))
+        return len(datos)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def vaciar(self):
+        datos = b''.join(self.bloques)
+        self.bloques = []
+        return datos
+
+def _partes_arrow(tabla_arrow):
+    """Escribe la tabla como stream IPC de Arrow, un record batch por parte."""
+    buffer = _BufferPartes()
+    escritor = pa.ipc.new_stream(buffer, tabla_arrow.schema)
+    for lote in tabla_arrow.to_batches(max_chunksize=FILAS_POR_LOTE):
+        escritor.write_batch(lote)
+        yield buffer.vaciar()
+    escritor.close()
+    yield buffer.vaciar()
+
+def responder(request, tabla, metadatos, documento_json, status=200):
+    """
+    Construye la respuesta en el formato negociado con el cliente.
+
+    Args:
+        request: Petición de Flask
+        tabla: Diccionario columna -> valores (arrays de NumPy o listas) para los formatos binarios
+        metadatos: Diccionario con los campos que acompañan a la tabla (status, user, cursor...)
+        documento_json: Función sin argumentos que devuelve el documento JSON de siempre
+        status: Código HTTP
+
+    Returns:
+        Response: Respuesta de Flask, comprimida si el cliente lo admite
+    """
+    formato = elegir_formato(request)
+    if formato is None:
+        # ❌ ERROR: Formato pedido no disponible
+        return jsonify({
+            "status": "failed",
+            "error": f"Formato no disponible. Disponibles: {', '.join(formatos_disponibles())}"
+        }), 406
+
+    codificacion = elegir_compresion(request)
+
+    if formato == 'arrow':
+        partes = _partes_arrow(_tabla_arrow(tabla, metadatos))
+    elif formato == 'msgpack':
+        partes = [msgpack.packb({**metadatos, "columns": tabla}, default=_codificar_msgpack)]
+    else:
+        partes = [jsonify(documento_json()).get_data()]
+
+    # Las respuestas pequeñas no compensan el coste de comprimir
+    if isinstance(partes, list) and len(partes[0]) < MIN_BYTES_COMPRESION:
+        codificacion = None
+    if codificacion is not None:
+        partes = _comprimir_partes(partes, codificacion)
+
+    respuesta = Response(partes, status=status, mimetype=FORMATOS[formato])
+    if codificacion is not None:
+        respuesta.headers['Content-Encoding'] = codificacion
+    respuesta.headers['Vary'] = 'Accept, Accept-Encoding'
+    return respuesta
@@ -0,0 +1,143 @@
+"""
+Cálculo vectorizado de índices espectrales a partir de las bandas Sentinel-2 guardadas.
+"""
+import numpy as np
+from sqlalchemy import select
+from models.Sentinel2 import Sentinel2
+
+# Cada índice es una diferencia normalizada:
+#   (suma(bandas positivas) - suma(bandas negativas)) / (suma(bandas positivas) + suma(bandas negativas))
+INDICES = {
+    'ndvi': (('b8',), ('b4',)),              # Vegetación
+    'ndbi': (('b11',), ('b8',)),             # Zonas edificadas
+    'ndwi': (('b3',), ('b8',)),              # Agua (McFeeters)
+    'mndwi': (('b3',), ('b11',)),            # Agua modificado
+    'ndmi': (('b8',), ('b11',)),             # Humedad
+    'nbr': (('b8',), ('b12',)),              # Áreas quemadas
+    'bsi': (('b11', 'b4'), ('b8', 'b2')),    # Suelo desnudo
+}
+
+def validar_indices(nombres=None):
+    """
+    Normaliza y valida la lista de índices pedidos.
+
+    Args:
+        nombres: Lista o cadena separada por comas con los índices (None = todos)
+
+    Returns:
+        list: Nombres de los índices en minúsculas
+    """
+    if not nombres:
+        return list(INDICES)
+    if isinstance(nombres, str):
+        nombres = nombres.split(',')
+    nombres = [nombre.strip().lower() for nombre in nombres if nombre.strip()]
+    desconocidos = [nombre for nombre in nombres if nombre not in INDICES]
+    if desconocidos:
+        raise ValueError(f"Índices desconocidos: {', '.join(desconocidos)}. Disponibles: {', '.join(INDICES)}")
+    return nombres
+
+def bandas_necesarias(indices):
+    """Devuelve las bandas necesarias para calcular los índices, sin repetir."""
+    bandas = []
+    for nombre in indices:
+        positivas, negativas = INDICES[nombre]
+        for banda in positivas + negativas:
+            if banda not in bandas:
+                bandas.append(banda)
+    return bandas
+
+def calcular_indices(bandas, indices=None):
+    """
+    Calcula los índices espectrales con operaciones de NumPy sobre lotes completos.
+
+    Args:
+        bandas: Diccionario banda -> array con las reflectancias de todas las filas
+        indices: Lista de índices a calcular (None = todos)
+
+    Returns:
+        dict: Índice -> array float32; NaN donde el denominador es 0
+    """
+    indices = validar_indices(indices)
+    resultado = {}
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for nombre in indices:
+            positivas, negativas = INDICES[nombre]
+            suma_pos = np.sum([np.asarray(bandas[b], dtype=np.float64) for b in positivas], axis=0)
+            suma_neg = np.sum([np.asarray(bandas[b], dtype=np.float64) for b in negativas], axis=0)
+            denominador = suma_pos + suma_neg
+            valor = (suma_pos - suma_neg) / denominador
+            valor[denominador == 0] = np.nan
+            resultado[nombre] = valor.astype(np.float32)
+    return resultado
+
+def calcular_indices_sentinel2(db_session, indices=None, bbox=None, anio=None, cursor=None, limit=5000):
+    """
+    Carga las bandas de la tabla Sentinel2 en una única consulta y calcula los índices.
+
+    Args:
+        db_session: Sesión de SQLAlchemy (db.session)
+        indices: Lista de índices a calcular (None = todos)
+        bbox: Tupla (oeste, sur, este, norte) para filtrar (opcional)
+        anio: Año de la imagen a filtrar (opcional)
+        cursor: Último id_sentinel2 devuelto en la página anterior (opcional)
+        limit: Número máximo de filas
+
+    Returns:
+        tuple: (array de ids, dict índice -> array, siguiente cursor o None)
+    """
+    indices = validar_indices(indices)
+    bandas = bandas_necesarias(indices)
+
+    # Solo se leen las columnas necesarias para los índices pedidos
+    stmt = select(Sentinel2.id_sentinel2, *[getattr(Sentinel2, b) for b in bandas])
+    if bbox is not None:
+        min_lon, min_lat, max_lon, max_lat = bbox
+        stmt = stmt.where(
+            Sentinel2.latitud.between(min_lat, max_lat),
+            Sentinel2.longitud.between(min_lon, max_lon)
+        )
+    if anio is not None:
+        stmt = stmt.where(Sentinel2.fecha.between(f'{anio}-01-01', f'{anio}-12-31'))
+    if cursor is not None:
+        stmt = stmt.where(Sentinel2.id_sentinel2 > cursor)
+    stmt = stmt.order_by(Sentinel2.id_sentinel2).limit(limit + 1)
+
+    filas = db_session.execute(stmt).all()
+    siguiente = None
+    if len(filas) > limit:
+        filas = filas[:limit]
+        siguiente = filas[-1][0]
+
+    # Matriz (filas x columnas): la primera columna es el id, el resto las bandas
+    matriz = np.array(filas, dtype=np.float64).reshape(len(filas), len(bandas) + 1)
+    ids = matriz[:, 0].astype(np.int64)
+    valores = calcular_indices({b: matriz[:, i + 1] for i, b in enumerate(bandas)}, indices)
+    return ids, valores, siguiente
+
+def expresion_sql(nombre):
+    """Devuelve la expresión SQL de PostgreSQL equivalente a un índice."""
+    positivas, negativas = INDICES[nombre]
+    suma_pos = ' + '.join(positivas)
+    suma_neg = ' + '.join(negativas)
+    return f"(({suma_pos}) - ({suma_neg})) / NULLIF(({suma_pos}) + ({suma_neg}), 0)"
+
+def ddl_columnas_generadas(indices=None, tabla='sentinel2'):
+    """
+    Genera el DDL de PostgreSQL (12+) que añade los índices como columnas generadas
+    almacenadas, de modo que la base de datos los mantiene al insertar.
+
+    Args:
+        indices: Lista de índices (None = todos)
+        tabla: Nombre de la tabla Sentinel-2
+
+    Returns:
+        str: Sentencias ALTER TABLE separadas por saltos de línea
+    """
+    sentencias = []
+    for nombre in validar_indices(indices):
+        sentencias.append(
+            f"ALTER TABLE {tabla} ADD COLUMN IF NOT EXISTS {nombre} DOUBLE PRECISION "
+            f"GENERATED ALWAYS AS ({expresion_sql(nombre)}) STORED;"
+        )
+    return '\n'.join(sentencias)
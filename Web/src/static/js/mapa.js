@@ -8,4 +8,86 @@ L.tileLayer('https://tile.openstreetmap.org/{z}/{x}/{y}.png', {
 document.getElementById('select-location').addEventListener('change', function(e) {
     let coords = e.target.value.split(',');
     map.setView(coords, 13);
-});
\ No newline at end of file
+});
+
+// Capa con los puntos etiquetados de la vista actual
+let capaPuntos = L.layerGroup().addTo(map);
+let peticionPuntos = null;
+
+// Máximo de puntos individuales que se dibujan; con más, la vista se muestra agrupada
+const MAX_PUNTOS_MAPA = 10000;
+
+function estiloPunto(feature) {
+    if (feature.properties.cluster) {
+        const total = feature.properties.total;
+        return {
+            radius: Math.min(6 + Math.log2(total) * 3, 30),
+            color: feature.properties.residuos > 0 ? '#dc3545' : '#0d6efd',
+            fillOpacity: 0.5
+        };
+    }
+    return {
+        radius: 5,
+        color: feature.properties.es_residuo ? '#dc3545' : '#198754',
+        fillOpacity: 0.8
+    };
+}
+
+function dibujarPuntos(data) {
+    L.geoJSON(data, {
+        pointToLayer: (feature, latlng) => L.circleMarker(latlng, estiloPunto(feature)),
+        onEachFeature: (feature, layer) => {
+            const p = feature.properties;
+            layer.bindTooltip(p.cluster
+                ? `${p.total} puntos (${p.residuos} residuos)`
+                : `${p.tipo_residuo || 'Sin etiqueta'} (${p.anio})`);
+        }
+    }).addTo(capaPuntos);
+}
+
+function cargarPagina(url, signal, cursor, dibujados) {
+    // La API devuelve como máximo MAPA_MAX_PUNTOS puntos por página: se siguen
+    // las páginas con next_cursor hasta tener todos los puntos de la vista o
+    // MAX_PUNTOS_MAPA, y entonces se piden los clusters de la vista
+    const pagina = cursor === null ? url : `${url}&cursor=${cursor}`;
+    return fetch(pagina, { signal: signal })
+    .then(response => response.json())
+    .then(data => {
+        if (data.status !== 'success') {
+            return;
+        }
+        if (cursor === null) {
+            capaPuntos.clearLayers();
+        }
+        dibujarPuntos(data);
+        if (data.next_cursor !== null && data.next_cursor !== undefined) {
+            const total = dibujados + data.features.length;
+            if (total >= MAX_PUNTOS_MAPA) {
+                // Sin cursor: los clusters sustituyen a los puntos ya dibujados
+                return cargarPagina(`${url}&cluster=true`, signal, null, 0);
+            }
+            return cargarPagina(url, signal, data.next_cursor, total);
+        }
+    });
+}
+
+function cargarPuntos() {
+    // Cancelar la petición anterior (y sus páginas) si el usuario sigue moviendo el mapa
+    if (peticionPuntos) {
+        peticionPuntos.abort();
+    }
+    peticionPuntos = new AbortController();
+
+    const bbox = map.getBounds().toBBoxString();
+    const zoom = map.getZoom();
+
+    cargarPagina(`/api/points/bbox?bbox=${bbox}&zoom=${zoom}`, peticionPuntos.signal, null, 0)
+    .catch(error => {
+        if (error.name !== 'AbortError') {
+            console.error('Error al cargar los puntos del mapa:', error);
+        }
+    });
+}
+
+map.on('moveend', cargarPuntos);
+cargarPuntos();
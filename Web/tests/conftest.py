@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Los módulos de la aplicación se importan desde Web/src, como al ejecutar app.py
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('ee')
+from bulk_extraction import generar_malla, contar_malla, tolerancia_malla, DECIMALES_MALLA
+
+
+def test_malla_regular_dentro_del_bbox():
+    # ~105 m x ~105 m con puntos cada 10 m: 11 x 11 puntos
+    min_lon, min_lat = -3.70, 42.30
+    max_lat = min_lat + 105 / 111320.0
+    max_lon = min_lon + 105 / (111320.0 * np.cos(np.radians((min_lat + max_lat) / 2)))
+    lats, lons = generar_malla(min_lon, min_lat, max_lon, max_lat, 10)
+
+    assert lats.shape == lons.shape == (121,)
+    assert lats.min() >= min_lat and lats.max() <= max_lat
+    assert lons.min() >= min_lon and lons.max() <= max_lon
+    assert len(set(zip(lats.tolist(), lons.tolist()))) == 121
+    np.testing.assert_array_equal(lats, np.round(lats, DECIMALES_MALLA))
+    assert contar_malla(min_lon, min_lat, max_lon, max_lat, 10) == 121
+
+
+def test_malla_de_un_punto():
+    lats, lons = generar_malla(-3.7, 42.3, -3.7, 42.3, 10)
+    assert lats.tolist() == [42.3]
+    assert lons.tolist() == [-3.7]
+    assert contar_malla(-3.7, 42.3, -3.7, 42.3, 10) == 1
+
+
+def test_contar_malla_no_genera_la_malla():
+    # Todo el mundo cada 10 m: se cuenta sin reservar memoria para la malla
+    assert contar_malla(-180, -60, 180, 60, 10) > 10 ** 12
+
+
+@pytest.mark.parametrize('lat', [0.0, 42.3, 65.0])
+def test_tolerancia_cubre_medio_paso_de_la_malla(lat):
+    # Cualquier punto de la región está a menos de la tolerancia de un punto de la malla
+    min_lon = -3.70
+    lats, lons = generar_malla(min_lon, lat, min_lon + 0.002, lat + 0.002, 10)
+    tolerancia_lat, tolerancia_lon = tolerancia_malla(lat + 0.001, 10)
+    paso_lat = np.diff(np.unique(lats)).max()
+    paso_lon = np.diff(np.unique(lons)).max()
+
+    assert paso_lat / 2 <= tolerancia_lat < paso_lat
+    assert paso_lon / 2 <= tolerancia_lon < paso_lon
+    assert tolerancia_lon >= tolerancia_lat
@@ -0,0 +1,94 @@
+import json
+import pytest
+
+pytest.importorskip('ee')
+import bulk_import
+from bulk_import import _normalizar, importar_puntos
+
+
+def test_normalizar_punto_etiquetado():
+    punto = _normalizar('-3.70000049', '42.3', {'anio': '2023', 'residuo': ' Plastico '}, 2024)
+    assert punto == {
+        "latitud": 42.3,
+        "longitud": -3.7,
+        "anio": 2023,
+        "es_residuo": True,
+        "tipo_residuo": "Plastico"
+    }
+
+
+def test_normalizar_valores_por_defecto():
+    punto = _normalizar(-3.7, 42.3, {'year': '2022.0'}, 2024)
+    assert punto['anio'] == 2022
+    assert punto['tipo_residuo'] == 'Ninguno' and punto['es_residuo'] is False
+
+    punto = _normalizar(-3.7, 42.3, {'residuo': 'NINGUNO'}, 2024)
+    assert punto['anio'] == 2024 and punto['es_residuo'] is False
+
+
+@pytest.mark.parametrize('lon, lat', [(None, 42.3), ('abc', 42.3), (-3.7, 91), (181, 42.3)])
+def test_normalizar_coordenadas_no_validas(lon, lat):
+    assert _normalizar(lon, lat, {}, 2024) is None
+
+
+class _SesionFalsa:
+    def __init__(self):
+        self.commits = 0
+
+    def get_bind(self):
+        return None
+
+    def commit(self):
+        self.commits += 1
+
+
+@pytest.fixture
+def importacion(monkeypatch, tmp_path):
+    """Sustituye la BD y Earth Engine: registra los puntos que se guardarían en cada tabla."""
+    guardados = {'aef': [], 's2': [], 'fallar_en': None}
+
+    def guardar(tabla):
+        def funcion(db_session, puntos, anio):
+            if guardados['fallar_en'] is not None and len(guardados[tabla]) >= guardados['fallar_en']:
+                raise RuntimeError("Earth Engine no responde")
+            guardados[tabla].extend((p['latitud'], anio) for p in puntos)
+            return len(puntos)
+        return funcion
+
+    monkeypatch.setattr(bulk_import, 'asegurar_particiones', lambda engine, anio: None)
+    monkeypatch.setattr(bulk_import, '_claves_existentes', lambda *args: set())
+    monkeypatch.setattr(bulk_import, 'guardar_aef_bulk', guardar('aef'))
+    monkeypatch.setattr(bulk_import, 'guardar_sentinel2_bulk', guardar('s2'))
+
+    ruta = tmp_path / 'puntos.csv'
+    filas = ['lat,lon,year,residuo'] + [f'42.{i},-3.7,2024,Plastico' for i in range(1, 8)]
+    ruta.write_text('\n'.join(filas) + '\n', encoding='utf-8')
+    return ruta, tmp_path / 'puntos.checkpoint.json', guardados
+
+
+def test_reanuda_desde_el_checkpoint(importacion):
+    ruta, checkpoint, guardados = importacion
+
+    # Primer intento: falla Earth Engine en el segundo lote de 3 puntos
+    guardados['fallar_en'] = 3
+    with pytest.raises(RuntimeError):
+        importar_puntos(_SesionFalsa(), str(ruta), tamano_lote=3, ruta_checkpoint=str(checkpoint))
+    estado = json.loads(checkpoint.read_text(encoding='utf-8'))
+    assert estado['filas_procesadas'] == 3 and estado['guardados_aef'] == 3
+
+    # Segundo intento: continúa en la fila 4 sin repetir los puntos ya guardados
+    guardados['fallar_en'] = None
+    sesion = _SesionFalsa()
+    resumen = importar_puntos(sesion, str(ruta), tamano_lote=3, ruta_checkpoint=str(checkpoint))
+
+    assert [lat for lat, _ in guardados['aef']] == [42.1, 42.2, 42.3, 42.4, 42.5, 42.6, 42.7]
+    assert resumen['filas_procesadas'] == 7 and resumen['guardados_aef'] == 7 and resumen['guardados_s2'] == 7
+    assert sesion.commits == 2
+    assert not checkpoint.exists()
+
+
+def test_checkpoint_de_otro_archivo(importacion, tmp_path):
+    ruta, checkpoint, _ = importacion
+    checkpoint.write_text(json.dumps({"archivo": str(tmp_path / 'otro.csv'), "filas_procesadas": 3}))
+    with pytest.raises(ValueError):
+        importar_puntos(_SesionFalsa(), str(ruta), ruta_checkpoint=str(checkpoint))
@@ -0,0 +1,17 @@
+import numpy as np
+from change_detection import distancias
+
+
+def test_distancias_coseno_y_euclidea():
+    anteriores = np.array([[1.0, 0.0], [1.0, 0.0], [3.0, 4.0]])
+    actuales = np.array([[1.0, 0.0], [0.0, 1.0], [-3.0, -4.0]])
+    coseno, euclidea = distancias(anteriores, actuales)
+
+    np.testing.assert_allclose(coseno, [0.0, 1.0, 2.0], atol=1e-12)
+    np.testing.assert_allclose(euclidea, [0.0, np.sqrt(2.0), 10.0])
+
+
+def test_embedding_nulo_tiene_distancia_coseno_maxima():
+    coseno, euclidea = distancias(np.zeros((1, 64)), np.ones((1, 64)))
+    assert coseno[0] == 1.0
+    assert euclidea[0] == 8.0
@@ -0,0 +1,87 @@
+import time
+import pytest
+from flask import Flask
+from werkzeug.security import generate_password_hash
+from config import TestingConfig
+from extensions import db
+from models.ModelUser import ModelUser, LoginThrottled
+from models.entities.User import User
+
+
+@pytest.fixture
+def app(monkeypatch):
+    app = Flask(__name__)
+    app.config.from_object(TestingConfig)
+    app.config.update(
+        SQLALCHEMY_DATABASE_URI='sqlite://',
+        SQLALCHEMY_ENGINE_OPTIONS={},
+        LOGIN_MAX_INTENTOS=3,
+        LOGIN_MAX_INTENTOS_ORIGEN=5
+    )
+    db.init_app(app)
+
+    # Estado de clase de ModelUser limpio en cada prueba
+    for atributo in ('_cache_usuarios', '_intentos_fallidos', '_intentos_por_origen', '_plazas_hash'):
+        monkeypatch.setattr(ModelUser, atributo, None)
+
+    with app.app_context():
+        db.metadata.create_all(db.engine, tables=[User.__table__])
+        db.session.add(User(None, 'ana', generate_password_hash('secreta', method='pbkdf2:sha256:1000')))
+        db.session.commit()
+        yield app
+        db.session.remove()
+
+
+def _login(username, password, origen='10.0.0.1'):
+    return ModelUser.login(db.session, User(0, username, password), origen=origen)
+
+
+def test_user_loader_usa_la_cache_hasta_invalidar(app):
+    id_ana = db.session.execute(db.select(User.id)).scalar_one()
+    assert ModelUser.get_by_id(db.session, id_ana).username == 'ana'
+
+    # Con el usuario en caché no se consulta la BD: se borra la fila y sigue devolviéndolo
+    db.session.execute(db.delete(User))
+    db.session.commit()
+    assert ModelUser.get_by_id(db.session, id_ana).username == 'ana'
+
+    ModelUser.invalidate(id_ana)
+    assert ModelUser.get_by_id(db.session, id_ana) is None
+
+
+def test_login_correcto_e_incorrecto(app):
+    assert _login('ana', 'secreta').password_hash
+    assert _login('ana', 'otra').password_hash is None
+    assert _login('nadie', 'otra') is None
+
+
+def test_bloqueo_por_usuario_y_origen(app):
+    for _ in range(3):
+        _login('ana', 'mal')
+    with pytest.raises(LoginThrottled):
+        _login('ana', 'secreta')
+    # Desde otro origen el mismo usuario puede entrar
+    assert _login('ana', 'secreta', origen='10.0.0.2').password_hash
+
+
+def test_bloqueo_por_origen_con_usuarios_distintos(app):
+    for i in range(5):
+        _login(f'usuario{i}', 'mal')
+    with pytest.raises(LoginThrottled):
+        _login('ana', 'secreta')
+    assert _login('ana', 'secreta', origen='10.0.0.2').password_hash
+
+
+def test_verificacion_saturada_rechaza_sin_esperar(app):
+    _login('ana', 'secreta')  # inicializa el semáforo
+    plazas = app.config['LOGIN_MAX_HASHES']
+    for _ in range(plazas):
+        ModelUser._plazas_hash.acquire()
+    try:
+        inicio = time.perf_counter()
+        with pytest.raises(LoginThrottled):
+            _login('ana', 'secreta')
+        assert time.perf_counter() - inicio < 0.5
+    finally:
+        for _ in range(plazas):
+            ModelUser._plazas_hash.release()
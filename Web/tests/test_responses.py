@@ -0,0 +1,82 @@
+import gzip
+import json
+import numpy as np
+import pytest
+from flask import Flask, request
+from responses import responder, MIN_BYTES_COMPRESION
+
+app = Flask(__name__)
+
+TABLA = {
+    "id": [1, 2, 3],
+    "tipo_residuo": ["Plastico", None, "Ninguno"],
+    "embedding": np.arange(3 * 64, dtype=np.float32).reshape(3, 64)
+}
+METADATOS = {"status": "success", "next_cursor": 3}
+
+
+def documento_json():
+    return {**METADATOS, "features": [{"id": i} for i in TABLA["id"]]}
+
+
+def responder_con(consulta='', cabeceras=None):
+    with app.test_request_context(f'/?{consulta}', headers=cabeceras or {}):
+        respuesta = responder(request, TABLA, METADATOS, documento_json)
+        if isinstance(respuesta, tuple):
+            respuesta, status = respuesta
+            respuesta.status_code = status
+        respuesta.direct_passthrough = False
+        return respuesta, respuesta.get_data()
+
+
+def test_json_por_defecto():
+    respuesta, cuerpo = responder_con()
+    assert respuesta.mimetype == 'application/json'
+    assert json.loads(cuerpo) == documento_json()
+
+
+def test_ida_y_vuelta_msgpack():
+    msgpack = pytest.importorskip('msgpack')
+    respuesta, cuerpo = responder_con(cabeceras={'Accept': 'application/msgpack'})
+    assert respuesta.mimetype == 'application/msgpack'
+
+    documento = msgpack.unpackb(cuerpo)
+    assert documento["status"] == "success" and documento["next_cursor"] == 3
+    columnas = documento["columns"]
+    assert columnas["id"] == [1, 2, 3]
+    assert columnas["tipo_residuo"] == ["Plastico", None, "Ninguno"]
+    embedding = columnas["embedding"]
+    matriz = np.frombuffer(embedding["data"], dtype=embedding["dtype"]).reshape(embedding["shape"])
+    np.testing.assert_array_equal(matriz, TABLA["embedding"])
+
+
+def test_ida_y_vuelta_arrow():
+    pa = pytest.importorskip('pyarrow')
+    respuesta, cuerpo = responder_con('format=arrow')
+    assert respuesta.mimetype == 'application/vnd.apache.arrow.stream'
+
+    tabla = pa.ipc.open_stream(cuerpo).read_all()
+    assert tabla.column("id").to_pylist() == [1, 2, 3]
+    assert tabla.column("tipo_residuo").to_pylist() == ["Plastico", None, "Ninguno"]
+    np.testing.assert_array_equal(np.array(tabla.column("embedding").to_pylist()), TABLA["embedding"])
+    assert json.loads(tabla.schema.metadata[b"next_cursor"]) == 3
+
+
+def test_arrow_comprimido_con_gzip():
+    pa = pytest.importorskip('pyarrow')
+    respuesta, cuerpo = responder_con('format=arrow', {'Accept-Encoding': 'gzip'})
+    assert respuesta.headers['Content-Encoding'] == 'gzip'
+    tabla = pa.ipc.open_stream(gzip.decompress(cuerpo)).read_all()
+    assert tabla.num_rows == 3
+
+
+def test_respuesta_pequena_sin_comprimir():
+    respuesta, cuerpo = responder_con(cabeceras={'Accept-Encoding': 'gzip'})
+    assert len(cuerpo) < MIN_BYTES_COMPRESION
+    assert 'Content-Encoding' not in respuesta.headers
+
+
+def test_formato_no_disponible():
+    respuesta, cuerpo = responder_con('format=xml')
+    assert respuesta.status_code == 406
+    assert json.loads(cuerpo)["status"] == "failed"
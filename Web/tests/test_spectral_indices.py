@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+from spectral_indices import calcular_indices, validar_indices, bandas_necesarias
+
+
+def test_ndvi_y_bsi_calculados_a_mano():
+    bandas = {
+        'b2': np.array([0.05, 0.10]),
+        'b4': np.array([0.10, 0.30]),
+        'b8': np.array([0.50, 0.20]),
+        'b11': np.array([0.25, 0.40]),
+    }
+    resultado = calcular_indices(bandas, ['ndvi', 'bsi'])
+
+    # NDVI = (b8 - b4) / (b8 + b4)
+    np.testing.assert_allclose(resultado['ndvi'], [0.4 / 0.6, -0.1 / 0.5], rtol=1e-6)
+    # BSI = ((b11 + b4) - (b8 + b2)) / ((b11 + b4) + (b8 + b2))
+    np.testing.assert_allclose(resultado['bsi'], [-0.20 / 0.90, 0.40 / 1.00], rtol=1e-6)
+    assert resultado['ndvi'].dtype == np.float32
+
+
+def test_denominador_cero_devuelve_nan():
+    resultado = calcular_indices({'b4': np.array([0.0, 0.1]), 'b8': np.array([0.0, 0.1])}, ['ndvi'])
+    assert np.isnan(resultado['ndvi'][0])
+    assert resultado['ndvi'][1] == 0.0
+
+
+def test_validar_indices():
+    assert validar_indices(' NDVI, nbr ') == ['ndvi', 'nbr']
+    assert validar_indices(None) == list(validar_indices('ndvi,ndbi,ndwi,mndwi,ndmi,nbr,bsi'))
+    with pytest.raises(ValueError):
+        validar_indices('ndvi,xyz')
+
+
+def test_bandas_necesarias_sin_repetir():
+    assert bandas_necesarias(['ndvi', 'bsi']) == ['b8', 'b4', 'b11', 'b2']